@@ -39,7 +39,7 @@ async def get_message_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     from .bot import TelegramBot
     user = update.message.from_user
     text = update.message.text
-    bot = await TelegramBot().get_instance()
+    bot = await TelegramBot.get_instance()
     await bot.broadcast_message(text)
     await update.message.reply_text(AdminBroadcastStates.end_message)
     return ConversationHandler.END
@@ -53,4 +53,6 @@ admin_broadcast_handler = ConversationHandler(
         AdminBroadcastStates.GET: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_message_command)],
     },
     fallbacks=[],
+    name="admin_broadcast",
+    persistent=True,
 )
@@ -4,21 +4,28 @@ from .config import Config
 from telegram import Update
 from telegram.error import TelegramError
 from telegram.ext import (
-    Application
+    Application,
+    ConversationHandler,
 )
 from .onboarding_handler import onboarding_handler
 from .completion_handler import completion_handler
 from .reflection_handler import add_reflection_handler
 from .help_handler import help_handler
 from .leaderboard_handler import leaderboard_handler
+from .rank_handler import rank_handler
+from .timezone_handler import timezone_handler
 from .start_handler import start_handler
 from .admin_broadcast_handler import admin_broadcast_handler
 from .edit_habit_handler import edit_habit_handler
 from .get_streak_handler import get_streak_handler
 from .error_handler import global_error_handler
 
-from .db.db import Database
+from .db.async_db import AsyncDatabase
 from .message_scheduler import MessageScheduler
+from .broadcaster import Broadcaster
+from .outbox import OutboxWorker
+from .persistence import SQLitePersistence
+from .ingestion import UpdateIngestor
 
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -29,10 +36,31 @@ class TelegramBot:
     _instance = None
 
     def __init__(self):
-        self.app = Application.builder().token(Config.TOKEN).build()
-        self.database = Database()
-        Database.get_db_connection()
-        self.message_scheduler = MessageScheduler.get_instance()
+        self.persistence = SQLitePersistence(update_interval=Config.PERSISTENCE_FLUSH_INTERVAL)
+        self.app = Application.builder().token(Config.TOKEN).persistence(self.persistence).build()
+        self.database = AsyncDatabase.get_instance()
+        self.broadcaster = Broadcaster(
+            self.app.bot,
+            rate=Config.BROADCAST_RATE,
+            burst=Config.BROADCAST_BURST,
+            concurrency=Config.BROADCAST_CONCURRENCY,
+        )
+        self.role = Config.PROCESS_ROLE
+        self.message_scheduler = MessageScheduler.get_instance() if self.role != "web" else None
+        # Web processes only queue broadcasts. Of the others, only the one holding
+        # the scheduler lease delivers them, so no message is sent twice.
+        self.outbox = OutboxWorker(
+            self.broadcaster,
+            deliver=self.role != "web",
+            is_leader=lambda: self.message_scheduler is not None and self.message_scheduler.holds_lease,
+            send_timeout=Config.OUTBOX_SEND_TIMEOUT,
+        )
+        self.ingestor = UpdateIngestor(
+            self.process_update,
+            workers=Config.INGEST_WORKERS,
+            queue_size=Config.INGEST_QUEUE_SIZE,
+        )
+        self._persistence_task = None
 
     async def _init_async(self):
         # Asynchronous initialization call
@@ -43,18 +71,46 @@ class TelegramBot:
         # Return the singleton instance, initializing it if necessary.
         if cls._instance is None:
             instance = cls()
+            instance._add_handlers()  # Before initializing, which loads persisted conversations
             await instance._init_async()  # Await asynchronous initialization
-            instance._add_handlers()
+            if instance.role != "worker":
+                instance.ingestor.start()
+                instance._persistence_task = asyncio.create_task(instance._update_persistence())
+            if instance.role != "web":
+                await instance.outbox.resume()  # Finish broadcasts interrupted by a restart
+                # Picks up broadcasts queued by other processes, and any left when the lease moves here.
+                instance.outbox.start_polling(Config.OUTBOX_POLL_INTERVAL)
             cls._instance = instance
         return cls._instance
         
 
+    async def _update_persistence(self):
+        # The application only saves its state from run_polling/run_webhook, which
+        # the webhook setup does not use, so changes are saved here instead.
+        while True:
+            await asyncio.sleep(self.persistence.update_interval)
+            try:
+                await self.app.update_persistence()
+                await self.persistence.flush()
+            except Exception:
+                logging.exception("❌ Failed to save conversation state")
+
+    async def shutdown(self):
+        """Saves pending conversation state and shuts the application down."""
+        if self._persistence_task is not None:
+            self._persistence_task.cancel()
+            await asyncio.gather(self._persistence_task, return_exceptions=True)
+            self._persistence_task = None
+        await self.app.shutdown()  # Updates and flushes the persistence one last time
+
     def _add_handlers(self):
         self.app.add_handler(onboarding_handler)
         self.app.add_handler(completion_handler)
         self.app.add_handler(add_reflection_handler)
         self.app.add_handler(help_handler)
         self.app.add_handler(leaderboard_handler)
+        self.app.add_handler(rank_handler)
+        self.app.add_handler(timezone_handler)
         self.app.add_handler(start_handler)
         self.app.add_handler(edit_habit_handler)
         self.app.add_handler(admin_broadcast_handler)
@@ -63,13 +119,30 @@ class TelegramBot:
 
     async def set_webhook(self):
         webhook_url = f"{Config.WEBHOOK_URL}/webhook"
-        await self.app.bot.set_webhook(webhook_url)
+        await self.app.bot.set_webhook(webhook_url, secret_token=Config.WEBHOOK_SECRET)
         logging.info(f"Webhook set to: {webhook_url}")
 
     async def process_update(self, update: dict):
         update_obj = Update.de_json(update, self.app.bot)
+        await self._refresh_conversations(update_obj)
         await self.app.process_update(update_obj)
 
+    async def _refresh_conversations(self, update: Update):
+        # Another process may have moved this chat's conversations on since they
+        # were loaded. ConversationHandler has no public way to reload a state,
+        # so its key and state mapping are read directly.
+        conversations = {}
+        for handlers in self.app.handlers.values():
+            for handler in handlers:
+                if isinstance(handler, ConversationHandler) and handler.persistent:
+                    try:
+                        key = handler._get_key(update)
+                    except RuntimeError:
+                        continue  # The update has no chat or user for this conversation
+                    conversations[handler.name] = (key, handler._conversations)
+        if conversations:
+            await self.persistence.refresh_conversations(conversations)
+
     async def send_message(self, user_id: int, text: str):
         """
         Sends a message to a single user.
@@ -87,31 +160,27 @@ class TelegramBot:
     async def broadcast_message(self, text: str, user_ids=None):
         """
         Sends a message to all users in the database while preventing Telegram rate limits.
+
+        The recipients are written to the persistent outbox first, so a
+        restart mid-broadcast resumes where it stopped.
         """
         if user_ids is None:
             logging.warning("Getting all users as user_ids are empty")
-            user_ids = Database.get_instance().get_all_users()  # Fetch users from DB
+            user_ids = await self.database.get_all_users()  # Fetch users from DB
 
         if not user_ids:
             logging.warning("⚠️ No users found in the database.")
             return
-        
-        success_count = 0
-        failure_count = 0
 
-        for i, user_id in enumerate(user_ids):
-            try:
-                await self.send_message(user_id, text)
-                success_count += 1
-                logging.info(f"Sent to user {user_id}")
+        await self.outbox.enqueue(text, user_ids)
 
-                if (i + 1) % 29 == 0:  # ✅ Pause after every 29 messages
-                    await asyncio.sleep(1)  # ✅ Wait for 1 second before sending more
-
-            except TelegramError as e:
-                failure_count += 1
-                logging.warning(f"⚠️ Failed to send message to {user_id}: {e}")
-
-            await asyncio.sleep(0.1)  # Delay 100ms between messages
+    async def broadcast_messages(self, messages, checkpoint=None):
+        """
+        Sends a different message to each user through the persistent outbox.
 
-        logging.info(f"✅ Broadcast completed: {success_count} sent, {failure_count} failed.")
\ No newline at end of file
+        Args:
+            messages: (user_id, text) pairs.
+            checkpoint: Optional (job key, shard, last rowid) recorded together
+                with the queued messages.
+        """
+        await self.outbox.enqueue(None, messages, checkpoint)
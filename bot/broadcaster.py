@@ -0,0 +1,150 @@
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Callable, Iterable, Optional, Tuple
+from telegram import Bot
+from telegram.error import Forbidden, BadRequest, RetryAfter, TelegramError
+
+
+class TokenBucket:
+    """
+    Async token bucket limiting how many messages go out per second.
+
+    Holds up to `burst` tokens and refills at `rate` tokens per second. A
+    RetryAfter from Telegram empties the bucket until the flood wait is over.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = None
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        if self._updated_at is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self):
+        """Waits until a token is available and takes it."""
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            while True:
+                now = loop.time()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Stops handing out tokens for `seconds`, e.g. after a RetryAfter."""
+        now = asyncio.get_running_loop().time()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0.0
+        self._updated_at = self._paused_until
+
+
+class Broadcaster:
+    """
+    Sends many messages at the highest rate Telegram allows.
+
+    A pool of `concurrency` sender tasks share one global TokenBucket, and
+    messages to the same chat are spaced at least `per_chat_interval` seconds
+    apart. RetryAfter pauses every sender for the requested time and the
+    message is retried; other transient errors are retried up to
+    `max_attempts` times.
+    """
+
+    def __init__(self, bot: Bot, rate: float = 25, burst: int = 5, concurrency: int = 8,
+                 per_chat_interval: float = 1.0, max_attempts: int = 3):
+        self.bot = bot
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = concurrency
+        self.per_chat_interval = per_chat_interval
+        self.max_attempts = max_attempts
+        self._chat_next_send = {}  # chat_id -> loop time the chat may be messaged again
+
+    async def _wait_for_chat(self, chat_id):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        next_send = self._chat_next_send.get(chat_id, now)
+        self._chat_next_send[chat_id] = max(now, next_send) + self.per_chat_interval
+        if next_send > now:
+            await asyncio.sleep(next_send - now)
+        if len(self._chat_next_send) > 10000:
+            # Forget chats whose interval has passed so the map stays bounded.
+            self._chat_next_send = {chat: t for chat, t in self._chat_next_send.items() if t > now}
+
+    async def send(self, chat_id, text: str) -> bool:
+        """
+        Sends one message within the rate limits.
+
+        Returns:
+            bool: True if Telegram accepted the message.
+        """
+        await self._wait_for_chat(chat_id)
+        for attempt in range(1, self.max_attempts + 1):
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text)
+                logging.info(f"📩 Message sent to user {chat_id}")
+                return True
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                logging.warning(f"⚠️ Flood limit hit, pausing broadcasts for {retry_after}s")
+                self.bucket.pause(retry_after)
+            except (Forbidden, BadRequest) as e:
+                # Blocked bot, deleted account or invalid chat: retrying will not help.
+                logging.warning(f"⚠️ Failed to send message to {chat_id}: {e}")
+                return False
+            except TelegramError as e:
+                logging.warning(f"⚠️ Failed to send message to {chat_id} (attempt {attempt}): {e}")
+                await asyncio.sleep(attempt)
+        return False
+
+    async def broadcast(self, messages: Iterable[Tuple], on_result: Optional[Callable] = None) -> Tuple[int, int]:
+        """
+        Sends every (chat_id, text) pair using the pool of sender tasks.
+
+        Items may carry extra fields after the text, e.g. a broadcast ID;
+        `on_result(item, sent)` is then called with the full item as each
+        message finishes.
+
+        Returns:
+            A tuple of (messages sent, messages failed).
+        """
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        counts = {True: 0, False: 0}
+
+        async def sender():
+            while True:
+                item = await queue.get()
+                try:
+                    if item is None:
+                        return
+                    sent = await self.send(item[0], item[1])
+                    counts[sent] += 1
+                    if on_result is not None:
+                        on_result(item, sent)
+                finally:
+                    queue.task_done()
+
+        senders = [asyncio.create_task(sender()) for _ in range(self.concurrency)]
+        try:
+            for item in messages:
+                await queue.put(item)
+            for _ in senders:
+                await queue.put(None)
+            await asyncio.gather(*senders)
+        finally:
+            for task in senders:
+                task.cancel()
+        return counts[True], counts[False]
@@ -1,6 +1,6 @@
 from telegram.ext import ConversationHandler, CommandHandler, MessageHandler, ContextTypes, filters
 from telegram import ReplyKeyboardMarkup, ReplyKeyboardRemove, Update
-from .db.db import Database
+from .db.async_db import AsyncDatabase
 
 class CompletionStates:
     START, QUESTION = range(2)
@@ -32,7 +32,7 @@ async def question_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.message.from_user
     text = update.message.text
     if text == "I'm done!":
-        Database.get_instance().update_streak_if_not_today(user.id)
+        await AsyncDatabase.get_instance().update_streak_if_not_today(user.id)
         await update.message.reply_text(CompletionStates.end_message_success)
     else:
         await update.message.reply_text(CompletionStates.end_message_failure)
@@ -45,4 +45,6 @@ completion_handler = ConversationHandler(
         CompletionStates.QUESTION: [MessageHandler(filters.TEXT & ~filters.COMMAND, question_command)],
     },
     fallbacks=[],
+    name="completion",
+    persistent=True,
 )
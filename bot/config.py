@@ -5,7 +5,52 @@ load_dotenv()
 
 class Config:
     TOKEN = os.getenv("BOT_TOKEN")
+    # "web" only ingests updates, "worker" runs the scheduler and delivers the
+    # outbox, and "all" does both in one process.
+    PROCESS_ROLE = os.getenv("PROCESS_ROLE", "all")
     WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+    # Sent by Telegram in X-Telegram-Bot-Api-Secret-Token with every update when set.
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+    # Comma-separated CIDRs allowed to call the webhook in addition to Telegram's subnets.
+    WEBHOOK_ALLOWED_CIDRS = [cidr for cidr in os.getenv("WEBHOOK_ALLOWED_CIDRS", "").split(",") if cidr.strip()]
     PORT = int(os.getenv("PORT", 8080))
     ADMIN_PW = os.getenv("ADMIN_PW")
-    
\ No newline at end of file
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 4))
+    # The whole database is a few MB, so a 16 MB page cache per connection and a
+    # 64 MB memory map keep it entirely in memory with room to grow.
+    DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", 16384))
+    DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", 64 * 1024 * 1024))
+    # Telegram allows about 30 messages per second overall and 1 per second per chat.
+    # Any one-second window can see up to rate + burst messages, so keep their sum under 30.
+    BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", 25))
+    BROADCAST_BURST = int(os.getenv("BROADCAST_BURST", 5))
+    BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", 8))
+    # Webhook updates are handled by this many workers, with at most this many queued.
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 8))
+    INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 1000))
+    # Seconds a /download_db snapshot is reused before a new one is taken.
+    SNAPSHOT_TTL = float(os.getenv("SNAPSHOT_TTL", 300))
+    # Each minute's reminders are split into this many shards, each starting after a
+    # random delay of up to DISPATCH_JITTER_SECONDS and queued this many users at a time.
+    DISPATCH_SHARDS = int(os.getenv("DISPATCH_SHARDS", 4))
+    DISPATCH_JITTER_SECONDS = float(os.getenv("DISPATCH_JITTER_SECONDS", 20))
+    DISPATCH_PAGE_SIZE = int(os.getenv("DISPATCH_PAGE_SIZE", 500))
+    # Reminder minutes missed while no process was dispatching are caught up on this far back.
+    DISPATCH_CATCH_UP_MINUTES = int(os.getenv("DISPATCH_CATCH_UP_MINUTES", 60))
+    # Scheduled jobs are stored here so runs missed during a restart are caught up.
+    SCHEDULER_DB_URL = os.getenv("SCHEDULER_DB_URL", "sqlite:///scheduler_jobs.db")
+    # Only the process holding the scheduler lease runs jobs; it renews it every third of this.
+    SCHEDULER_LEASE_TTL = float(os.getenv("SCHEDULER_LEASE_TTL", 30))
+    # How often a worker checks the outbox for broadcasts queued by web processes.
+    OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 2))
+    # Outbox rows still marked as sending this many seconds after being claimed were
+    # left by a process that stopped mid-send, and are sent again.
+    OUTBOX_SEND_TIMEOUT = float(os.getenv("OUTBOX_SEND_TIMEOUT", 300))
+    # Broadcasts and their outbox rows are deleted this many days after they finish.
+    OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", 7))
+    # Conversation states and user_data are written to the database at most this often.
+    PERSISTENCE_FLUSH_INTERVAL = float(os.getenv("PERSISTENCE_FLUSH_INTERVAL", 5))
+    # Recently used Users rows are kept in memory, at most this many and for at most
+    # this many seconds, which bounds how stale a row written by another process can be.
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 4096))
+    USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 30))
@@ -0,0 +1,197 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Tuple, Optional
+from .db import Database
+from .db_utils import PackedStreak
+
+
+class AsyncDatabase:
+    """
+    Awaitable facade over Database.
+
+    Every call is run on a worker thread so that SQLite queries and commits
+    never block the event loop serving /webhook. The executor has one thread
+    per pooled read connection plus one for the writer.
+    """
+    _instance = None  # Class variable to store the singleton instance
+
+    def __init__(self):
+        """Private constructor to prevent direct instantiation."""
+        if AsyncDatabase._instance is not None:
+            raise Exception("This class is a singleton! Use get_instance() instead.")
+
+        self.db = Database.get_instance()
+        self.executor = ThreadPoolExecutor(max_workers=self.db.pool.size + 1, thread_name_prefix="db")
+
+    @classmethod
+    def get_instance(cls):
+        """Factory method to get the singleton instance."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    async def _run(self, func, *args, **kwargs):
+        """Runs a blocking Database method on the executor and awaits its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    async def add_new_user(self, user: Tuple[str, str, str, str, str, int, str, str, int, str]):
+        return await self._run(self.db.add_new_user, user)
+
+    async def update_reflection(self, telegram: str, reflection: str):
+        return await self._run(self.db.update_reflection, telegram, reflection)
+
+    async def update_habit(self, telegram: str, habit, location, time_period):
+        return await self._run(self.db.update_habit, telegram, habit, location, time_period)
+
+    async def update_timezone(self, telegram: str, tz_offset_minutes: int) -> bool:
+        return await self._run(self.db.update_timezone, telegram, tz_offset_minutes)
+
+    async def retrieve_random_reflection(self, telegram: str) -> Optional[str]:
+        return await self._run(self.db.retrieve_random_reflection, telegram)
+
+    async def retrieve_random_reflections(self, telegrams: Iterable[str]) -> Dict[str, str]:
+        return await self._run(self.db.retrieve_random_reflections, telegrams)
+
+    async def update_last_done_date(self, telegram: str, last_done_date: str):
+        return await self._run(self.db.update_last_done_date, telegram, last_done_date)
+
+    async def retrieve_last_done_date(self, telegram: str) -> Optional[int]:
+        return await self._run(self.db.retrieve_last_done_date, telegram)
+
+    async def retrieve_streak(self, telegram: str) -> Optional[PackedStreak]:
+        return await self._run(self.db.retrieve_streak, telegram)
+
+    async def is_user_registered(self, telegram: str) -> bool:
+        return await self._run(self.db.is_user_registered, telegram)
+
+    async def update_streak_if_not_today(self, telegram: str):
+        return await self._run(self.db.update_streak_if_not_today, telegram)
+
+    async def get_users_completed_on(self, day: str) -> List[str]:
+        return await self._run(self.db.get_users_completed_on, day)
+
+    async def get_completion_counts(self, start: str, end: str) -> Dict[str, int]:
+        return await self._run(self.db.get_completion_counts, start, end)
+
+    async def is_streak_broken(self, telegram):
+        return await self._run(self.db.is_streak_broken, telegram)
+
+    @property
+    def leaderboard_version(self) -> int:
+        """Changes whenever the top of the leaderboard changes. Read from memory, no query."""
+        return self.db.leaderboard.version
+
+    async def refresh_leaderboard(self):
+        return await self._run(self.db.refresh_leaderboard)
+
+    async def get_leaderboard(self):
+        return await self._run(self.db.get_leaderboard)
+
+    async def get_rank(self, telegram: str) -> Optional[int]:
+        return await self._run(self.db.get_rank, telegram)
+
+    async def get_standing(self, telegram: str, neighbours: int = 2) -> Optional[dict]:
+        return await self._run(self.db.get_standing, telegram, neighbours)
+
+    async def update_points(self, telegram: str, points: int):
+        return await self._run(self.db.update_points, telegram, points)
+
+    async def retrieve_points(self, telegram: str) -> Optional[int]:
+        return await self._run(self.db.retrieve_points, telegram)
+
+    async def add_new_weekly_challenge(self, weeklychallenge: Tuple[str, str, str, str]):
+        return await self._run(self.db.add_new_weekly_challenge, weeklychallenge)
+
+    async def retrieve_challenge(self, category: str, challenge_number: int) -> Optional[str]:
+        return await self._run(self.db.retrieve_challenge, category, challenge_number)
+
+    async def add_new_information(self, info: Tuple[int, str]):
+        return await self._run(self.db.add_new_information, info)
+
+    async def retrieve_information(self, date: int) -> Optional[str]:
+        return await self._run(self.db.retrieve_information, date)
+
+    async def open_snapshot(self) -> BinaryIO:
+        return await self._run(self.db.open_snapshot)
+
+    def export(self, table: str, fmt: str = "csv", since: Optional[str] = None) -> Iterator[bytes]:
+        """
+        Returns the blocking chunk generator of Database.export.
+
+        Not a coroutine: iterate it on a worker thread, as StreamingResponse
+        does for plain iterators.
+        """
+        return self.db.export(table, fmt, since)
+
+    async def update_all_streaks(self) -> Tuple[int, float]:
+        return await self._run(self.db.update_all_streaks)
+
+    async def acquire_lease(self, name: str, holder: str, ttl: float) -> bool:
+        return await self._run(self.db.acquire_lease, name, holder, ttl)
+
+    async def release_lease(self, name: str, holder: str):
+        return await self._run(self.db.release_lease, name, holder)
+
+    async def get_persisted_data(self, kind: str) -> Dict[str, Tuple[int, str]]:
+        return await self._run(self.db.get_persisted_data, kind)
+
+    async def get_persisted_entry(self, kind: str, key: str) -> Optional[Tuple[int, Optional[str]]]:
+        return await self._run(self.db.get_persisted_entry, kind, key)
+
+    async def get_persisted_entries(self, entries: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], Tuple[int, Optional[str]]]:
+        return await self._run(self.db.get_persisted_entries, entries)
+
+    async def save_persisted_data(self, entries: Iterable[Tuple[str, str, Optional[str]]]) -> Dict[Tuple[str, str], int]:
+        return await self._run(self.db.save_persisted_data, entries)
+
+    async def get_all_users(self):
+        return await self._run(self.db.get_all_users)
+
+    async def get_users_streaks_breaking(self):
+        return await self._run(self.db.get_users_streaks_breaking)
+
+    async def get_users_streaks_broken(self):
+        return await self._run(self.db.get_users_streaks_broken)
+
+    async def get_users_reminder_due(self, slot: int, shard: int = 0, shards: int = 1,
+                                     after_rowid: int = 0, limit: int = -1) -> List[Tuple[int, str, int]]:
+        return await self._run(self.db.get_users_reminder_due, slot, shard, shards, after_rowid, limit)
+
+    async def get_users_broken_due(self, slot: int, shard: int = 0, shards: int = 1,
+                                   after_rowid: int = 0, limit: int = -1) -> List[Tuple[int, str, int]]:
+        return await self._run(self.db.get_users_broken_due, slot, shard, shards, after_rowid, limit)
+
+    async def start_job(self, job_key: str, shards: int) -> Dict[int, Tuple[int, bool]]:
+        return await self._run(self.db.start_job, job_key, shards)
+
+    async def complete_job_shard(self, job_key: str, shard: int):
+        return await self._run(self.db.complete_job_shard, job_key, shard)
+
+    async def get_counter(self, name: str) -> Optional[int]:
+        return await self._run(self.db.get_counter, name)
+
+    async def set_counter(self, name: str, value: int):
+        return await self._run(self.db.set_counter, name, value)
+
+    async def create_broadcast(self, text: Optional[str], recipients: Iterable,
+                               checkpoint: Optional[Tuple[str, int, int]] = None) -> int:
+        return await self._run(self.db.create_broadcast, text, recipients, checkpoint)
+
+    async def claim_outbox_batch(self, limit: int) -> List[Tuple[int, str, str]]:
+        return await self._run(self.db.claim_outbox_batch, limit)
+
+    async def complete_outbox_batch(self, results: Iterable[Tuple[int, str, bool]]):
+        return await self._run(self.db.complete_outbox_batch, results)
+
+    async def requeue_inflight_outbox(self, timeout: float) -> int:
+        return await self._run(self.db.requeue_inflight_outbox, timeout)
+
+    async def get_broadcast_status(self, broadcast_id: int) -> dict:
+        return await self._run(self.db.get_broadcast_status, broadcast_id)
+
+    def close(self):
+        """Stops the executor and closes the underlying connection pool."""
+        self.executor.shutdown(wait=True)
+        self.db.close()
@@ -1,13 +1,83 @@
 import sqlite3
+import threading
 from sqlite3 import Error
-from typing import Tuple, Optional
-from random import choice
-from datetime import datetime, timedelta, UTC, timezone
-from .db_utils import streak_to_points
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Tuple, Optional
+from collections import Counter
+from random import choice, randint
+from datetime import date, datetime, timedelta, UTC, timezone
+from time import perf_counter
+from .db_utils import (
+    DEFAULT_TZ_OFFSET_MINUTES, PackedStreak, StreakScore, reminder_slots, score_day, score_streak,
+    streak_append, to_day_number,
+)
+from .pool import ConnectionPool
+from .leaderboard import Leaderboard
+from .user_cache import MISSING, UserCache
+from .snapshot import SnapshotCache
+from .export import export_rows
+from .migrations import bootstrap
+from ..config import Config
 import logging
 
 DATABASE_NAME = "internal_proj.db"
 
+# Applied to every pooled connection. WAL makes NORMAL durable across crashes
+# while only syncing at checkpoints instead of on every commit.
+CONNECTION_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "cache_size": -Config.DB_CACHE_SIZE_KB,  # Negative values are in KiB.
+    "mmap_size": Config.DB_MMAP_SIZE,
+    "temp_store": "MEMORY",
+}
+
+# SQL functions registered on every pooled connection.
+CONNECTION_FUNCTIONS = {
+    "streak_append": (2, streak_append),
+}
+
+# Records a missed day for every user who did not complete :day, unless the
+# day was already closed for them or a completion for it is logged.
+# {user_filter} narrows it to one user.
+MISSED_DAY_UPDATE = """
+    UPDATE Users
+    SET StreakBits = CASE
+            WHEN LastDoneDay IS NULL THEN :reset_streak
+            ELSE streak_append(StreakBits, 0)
+        END,
+        StreakDays = CASE
+            WHEN LastDoneDay IS NULL THEN 1
+            ELSE COALESCE(NULLIF(StreakDays, 0), 1) + 1
+        END,
+        CurrentRun = 0,
+        LongestRun = CASE
+            WHEN LastDoneDay IS NULL THEN 0
+            ELSE LongestRun
+        END,
+        -- Same transitions as db_utils.score_day for a missed day.
+        BankedPoints = CASE
+            WHEN LastDoneDay IS NULL THEN 0
+            WHEN PendingMiss THEN BankedPoints + (SegmentLength / 2) * (SegmentLength / 2 + 1) / 2
+            ELSE BankedPoints
+        END,
+        SegmentLength = CASE
+            WHEN LastDoneDay IS NULL THEN 1
+            WHEN PendingMiss THEN 0
+            ELSE SegmentLength + 1
+        END,
+        PendingMiss = CASE
+            WHEN LastDoneDay IS NULL THEN 1
+            WHEN PendingMiss THEN 0
+            ELSE 1
+        END,
+        ClosedDay = :day
+    WHERE (LastDoneDay IS NULL OR LastDoneDay != :day)
+      AND (ClosedDay IS NULL OR ClosedDay < :day)
+      AND NOT EXISTS (
+          SELECT 1 FROM Completions c WHERE c.Telegram = Users.Telegram AND c.Date = :day_date
+      )
+      {user_filter}
+"""
+
 class Database:
     _instance = None  # Class variable to store the singleton instance
 
@@ -16,93 +86,50 @@ class Database:
         if Database._instance is not None:
             raise Exception("This class is a singleton! Use get_instance() instead.")
 
-        self.con = self.get_db_connection()
-        self.cursor = self.con.cursor() if self.con else None
+        self.pool = self.get_db_pool()
+        self.leaderboard = Leaderboard()
+        # Guards the board together with the Counters value it reflects.
+        self._leaderboard_lock = threading.Lock()
+        self._leaderboard_version = None
+        self.load_leaderboard()
+        self.user_cache = UserCache(max_size=Config.USER_CACHE_SIZE, ttl=Config.USER_CACHE_TTL)
+        self.snapshots = SnapshotCache(self.pool, ttl=Config.SNAPSHOT_TTL)
 
     @classmethod
     def get_instance(cls):
         """Factory method to get the singleton instance."""
         if cls._instance is None:
             cls._instance = cls()
-            cls._instance.create_users_table()
-            cls._instance.create_challenges_table()
-            cls._instance.create_info_table()
-            cls._instance.create_reflections_table()  # <-- Added this line
         return cls._instance
     
     @staticmethod
-    def get_db_connection():
-        """Establish and return a connection to the SQLite database."""
+    def get_db_pool():
+        """Migrate the SQLite database and return a connection pool for it."""
         try:
-            con = sqlite3.connect(DATABASE_NAME, check_same_thread=False)
-            con.row_factory = sqlite3.Row
-            return con
+            bootstrap(DATABASE_NAME)
+            return ConnectionPool(
+                DATABASE_NAME,
+                size=Config.DB_POOL_SIZE,
+                pragmas=CONNECTION_PRAGMAS,
+                functions=CONNECTION_FUNCTIONS,
+            )
         except Error as e:
             print(f"Database Connection Error: {e}")
             return None
 
 
     def close(self):
-        """Closes the database connection."""
-        if self.con:
-            self.con.close()
-
-    def create_users_table(self):
-        """Creates the Users table if it does not exist."""
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS Users (
-                Telegram TEXT PRIMARY KEY,
-                TelegramHandle TEXT,
-                Habit TEXT,
-                Location TEXT,
-                TimePeriod TEXT,
-                ReflectionConsent INTEGER,
-                lastDoneDate TEXT,
-                Streak TEXT,
-                Points INTEGER,
-                Category TEXT
-            )
-        """)
-        self.con.commit()
-
-    def create_reflections_table(self):
-        """Creates the Reflections table to store multiple reflections per user."""
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS Reflections (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                Telegram TEXT,
-                Reflection TEXT,
-                CreatedAt TEXT,
-                FOREIGN KEY (Telegram) REFERENCES Users(Telegram)
-            )
-        """)
-        self.con.commit()
-
-    def create_challenges_table(self):
-        """Creates the WeeklyChallenges table."""
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS WeeklyChallenges (
-                Category TEXT PRIMARY KEY,
-                Challenge1 TEXT,
-                Challenge2 TEXT,
-                Challenge3 TEXT
-            )
-        """)
-        self.con.commit()
-
-    def create_info_table(self):
-        """Creates the Information table."""
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS Information (
-                Date INTEGER PRIMARY KEY,
-                Content TEXT
-            )
-        """)
-        self.con.commit()
+        """Closes every pooled database connection."""
+        self.snapshots.close()
+        if self.pool:
+            self.pool.close()
 
     def add_new_user(self, user: Tuple[str, str, str, str, str, int, str, str, int, str]):
         """
         Inserts a new user into the Users table without a Reflection field.
+
+        The user starts in the default timezone, with reminders at the time of
+        day found in TimePeriod.
         
         Args:
             user: A tuple containing:
@@ -113,16 +140,30 @@ class Database:
                 - TimePeriod (str)
                 - ReflectionConsent (int)
                 - lastDoneDate (str) in "YYYY-MM-DD" format (or NULL if not set)
-                - Streak (str)
+                - Streak (str), stored packed (see PackedStreak)
                 - Points (int)
                 - Category (str)
         """
-        self.cursor.execute("""
-            INSERT INTO Users 
-            (Telegram, TelegramHandle, Habit, Location, TimePeriod, ReflectionConsent, lastDoneDate, Streak, Points, Category)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, user)
-        self.con.commit()
+        streak = PackedStreak.from_text(user[7])
+        score = score_streak(streak)
+        last_done_day = to_day_number(user[6])
+        row = user[:6] + (
+            user[6] if last_done_day is None else user[6].strip(), last_done_day,
+            streak.to_blob(), len(streak), streak.current_run(), streak.longest_run(),
+            score.banked, score.segment_length, int(score.pending_miss),
+            DEFAULT_TZ_OFFSET_MINUTES,
+        ) + reminder_slots(user[4], DEFAULT_TZ_OFFSET_MINUTES) + user[8:]
+        with self.pool.writer() as cursor:
+            cursor.execute("""
+                INSERT INTO Users 
+                (Telegram, TelegramHandle, Habit, Location, TimePeriod, ReflectionConsent, lastDoneDate, LastDoneDay,
+                 StreakBits, StreakDays, CurrentRun, LongestRun, BankedPoints, SegmentLength, PendingMiss,
+                 TzOffsetMinutes, ReminderSlot, BrokenStreakSlot, Points, Category)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, row)
+            # Updated under the writer lock so the board sees writes in commit order.
+            self._update_leaderboard(cursor, user[0], user[8], handle=user[1])
+        self.user_cache.invalidate(user[0])
 
     def update_reflection(self, telegram: str, reflection: str):
         from datetime import datetime, timedelta, timezone
@@ -130,74 +171,179 @@ class Database:
         now_utc5 = datetime.now(timezone.utc) + timedelta(hours=5)
         created_at_str = now_utc5.strftime("%Y-%m-%d %H:%M:%S")
         
-        self.cursor.execute("""
-            INSERT INTO Reflections (Telegram, Reflection, CreatedAt)
-            VALUES (?, ?, ?)
-        """, (telegram, reflection, created_at_str))
-        self.con.commit()
+        with self.pool.writer() as cursor:
+            cursor.execute("""
+                INSERT INTO Reflections (Telegram, Reflection, CreatedAt)
+                VALUES (?, ?, ?)
+            """, (telegram, reflection, created_at_str))
 
     
     def update_habit(self, telegram: str, habit, location, time_period):
-        if habit:
-            self.cursor.execute(f"UPDATE Users SET Habit = ? WHERE Telegram = ?", (habit, telegram))
-            self.con.commit()
-        if location:
-            self.cursor.execute(f"UPDATE Users SET Location = ? WHERE Telegram = ?", (location, telegram))
-            self.con.commit()
-        if time_period:
-            self.cursor.execute(f"UPDATE Users SET TimePeriod = ? WHERE Telegram = ?", (time_period, telegram))
-            self.con.commit()
+        with self.pool.writer() as cursor:
+            if habit:
+                cursor.execute(f"UPDATE Users SET Habit = ? WHERE Telegram = ?", (habit, telegram))
+            if location:
+                cursor.execute(f"UPDATE Users SET Location = ? WHERE Telegram = ?", (location, telegram))
+            if time_period:
+                cursor.execute(f"UPDATE Users SET TimePeriod = ? WHERE Telegram = ?", (time_period, telegram))
+                self._update_reminder_slots(cursor, telegram)
+        self.user_cache.invalidate(telegram)
+
+    def update_timezone(self, telegram: str, tz_offset_minutes: int) -> bool:
+        """
+        Moves a user to another timezone, keeping their local message times.
+
+        Args:
+            telegram: The user's Telegram ID.
+            tz_offset_minutes: The offset from UTC in minutes, e.g. 480 for UTC+8.
+
+        Returns:
+            bool: False if the user is not registered.
+        """
+        with self.pool.writer() as cursor:
+            cursor.execute(
+                "UPDATE Users SET TzOffsetMinutes = ? WHERE Telegram = ?",
+                (tz_offset_minutes, telegram)
+            )
+            if cursor.rowcount == 0:
+                return False
+            self._update_reminder_slots(cursor, telegram)
+        self.user_cache.invalidate(telegram)
+        return True
+
+    @staticmethod
+    def _update_reminder_slots(cursor: sqlite3.Cursor, telegram: str):
+        """Recomputes a user's slots from their TimePeriod and timezone, inside a write."""
+        cursor.execute("SELECT TimePeriod, TzOffsetMinutes FROM Users WHERE Telegram = ?", (telegram,))
+        user_data = cursor.fetchone()
+        if user_data:
+            cursor.execute(
+                "UPDATE Users SET ReminderSlot = ?, BrokenStreakSlot = ? WHERE Telegram = ?",
+                reminder_slots(user_data["TimePeriod"], user_data["TzOffsetMinutes"]) + (telegram,)
+            )
 
     def retrieve_random_reflection(self, telegram: str) -> Optional[str]:
         """
         Retrieves a random reflection from users (other than the specified Telegram)
         that have granted reflection consent (ReflectionConsent = 1).
+
+        Probes a random Slot of SharedReflections, which only holds consented
+        reflections, so the cost does not grow with the number of reflections.
+        Slots freed by deletions make the following reflection slightly more
+        likely to be picked.
         """
-        # This query joins Reflections and Users so we only select reflections
-        # where the user has ReflectionConsent = 1 and is not the given telegram.
-        query = """
-            SELECT r.Reflection
-            FROM Reflections r
-            JOIN Users u ON r.Telegram = u.Telegram
-            WHERE r.Telegram != ? AND u.ReflectionConsent = 1
-        """
-        self.cursor.execute(query, (telegram,))
-        data = self.cursor.fetchall()
-        if not data:
-            return None
-        from random import choice
-        return choice([row["Reflection"] for row in data])
+        with self.pool.reader() as cursor:
+            cursor.execute("SELECT MIN(Slot) AS Low, MAX(Slot) AS High FROM SharedReflections")
+            bounds = cursor.fetchone()
+            if bounds["Low"] is None:
+                return None
+            slot = randint(bounds["Low"], bounds["High"])
+            query = """
+                SELECT r.Reflection
+                FROM SharedReflections s
+                JOIN Reflections r ON r.id = s.ReflectionId
+                WHERE s.Slot {} ? AND s.Telegram != ?
+                ORDER BY s.Slot {}
+                LIMIT 1
+            """
+            # Take the first slot at or after the probe, wrapping around to the start.
+            cursor.execute(query.format(">=", "ASC"), (slot, telegram))
+            result = cursor.fetchone()
+            if result is None:
+                cursor.execute(query.format("<", "ASC"), (slot, telegram))
+                result = cursor.fetchone()
+        return result["Reflection"] if result else None
+
+    def retrieve_random_reflections(self, telegrams: Iterable[str]) -> Dict[str, str]:
+        """
+        Picks a random consented reflection from another user for every given user.
 
-    def update_last_done_date(self, telegram: str, last_done_date: int):
-        """Updates the last done date for a user."""
-        self.cursor.execute("UPDATE Users SET lastDoneDate = ? WHERE Telegram = ?", (last_done_date, telegram))
-        self.con.commit()
+        Loads the consented reflection IDs from SharedReflections once and
+        samples them in memory, then fetches only the chosen texts.
+
+        Returns:
+            A dict of Telegram ID -> reflection text. Users for whom no other
+            user's reflection is available are left out.
+        """
+        with self.pool.reader() as cursor:
+            cursor.execute("SELECT ReflectionId, Telegram FROM SharedReflections")
+            eligible = [(row["ReflectionId"], row["Telegram"]) for row in cursor.fetchall()]
+        if not eligible:
+            return {}
+
+        authored = Counter(author for _, author in eligible)
+        assignments = {}
+        for telegram in telegrams:
+            telegram = str(telegram)
+            if authored[telegram] == len(eligible):
+                continue  # Only their own reflections are available.
+            # Rejection sampling: redraw while the pick is the user's own reflection.
+            while True:
+                reflection_id, author = choice(eligible)
+                if author != telegram:
+                    break
+            assignments[telegram] = reflection_id
+
+        texts = {}
+        chosen_ids = list(set(assignments.values()))
+        with self.pool.reader() as cursor:
+            # Stay under SQLite's bound parameter limit.
+            for start in range(0, len(chosen_ids), 500):
+                chunk = chosen_ids[start:start + 500]
+                cursor.execute(
+                    f"SELECT id, Reflection FROM Reflections WHERE id IN ({', '.join('?' * len(chunk))})",
+                    chunk
+                )
+                texts.update((row["id"], row["Reflection"]) for row in cursor.fetchall())
+        return {telegram: texts[reflection_id] for telegram, reflection_id in assignments.items()}
+
+    def update_last_done_date(self, telegram: str, last_done_date: str):
+        """Updates the last done date ("YYYY-MM-DD") and its day number for a user."""
+        with self.pool.writer() as cursor:
+            cursor.execute(
+                "UPDATE Users SET lastDoneDate = ?, LastDoneDay = ? WHERE Telegram = ?",
+                (last_done_date, to_day_number(last_done_date), telegram)
+            )
+        self.user_cache.invalidate(telegram)
+
+    def _get_user_row(self, telegram: str) -> Optional[dict]:
+        """
+        Retrieves a user's Users row as a dict, or None if they are not registered.
+
+        Served from the user cache when possible; see UserCache.
+        """
+        user_data = self.user_cache.get(telegram)
+        if user_data is not MISSING:
+            return user_data
+        version = self.user_cache.version
+        with self.pool.reader() as cursor:
+            cursor.execute("SELECT * FROM Users WHERE Telegram = ?", (telegram,))
+            result = cursor.fetchone()
+        if result is None:
+            return None
+        user_data = dict(result)
+        self.user_cache.put(telegram, user_data, version)
+        return user_data
     
     def retrieve_last_done_date(self, telegram: str) -> Optional[int]:
         """Retrieves a user's last done date."""
-        self.cursor.execute("SELECT lastDoneDate FROM Users WHERE Telegram = ?", (telegram,))
-        result = self.cursor.fetchone()
-        return result["lastDoneDate"] if result else None
+        user_data = self._get_user_row(telegram)
+        return user_data["lastDoneDate"] if user_data else None
 
-    def retrieve_streak(self, telegram: str) -> Optional[str]:
-        self.cursor.execute("SELECT * FROM Users WHERE Telegram = ?", (telegram,))
-        user_data = self.cursor.fetchone()
+    def retrieve_streak(self, telegram: str) -> Optional[PackedStreak]:
+        user_data = self._get_user_row(telegram)
 
         if user_data:
-            return user_data["Streak"] if user_data["Streak"] else "0"
+            if user_data["StreakBits"]:
+                return PackedStreak.from_blob(user_data["StreakBits"])
+            return PackedStreak.from_text("0")
         
         logging.warning(f"⚠️ No user found for Telegram ID: {telegram}")
         return None
     
     def is_user_registered(self, telegram: str) -> bool:
         """Checks if a user exists in the Users table."""
-        self.cursor.execute("SELECT 1 FROM Users WHERE Telegram = ?", (telegram,))
-        result = self.cursor.fetchone()
-
-        if result:
-            return True
-        else:
-            return False
+        return self._get_user_row(telegram) is not None
     
     def update_streak_if_not_today(self, telegram: str):
         """
@@ -205,28 +351,114 @@ class Database:
         If not, increments the user's streak by 1 and updates lastDoneDate to today's date.
         
         This ensures that each day's challenge is only counted once.
+
+        If the nightly rollover has not closed yesterday yet, it is closed for
+        this user first, so a missed yesterday is recorded before today's
+        completion rather than after it.
+
+        The user's row usually comes from the user cache, so a completion costs
+        one UPDATE. The UPDATE only applies if the row still holds the values
+        the new score was computed from; if it was changed meanwhile, e.g. by
+        the nightly rollover, the row is read again under the writer lock and
+        the day is scored again.
         """
         # Get current date adjusted to UTC+5
         current_date = (datetime.now(UTC) + timedelta(hours=5)).date()
         current_date_str = current_date.isoformat()  # "YYYY-MM-DD"
 
-        # Retrieve the user's last done date (assumed to be stored as "YYYY-MM-DD")
-        last_done_date = self.retrieve_last_done_date(telegram)
-        
+        user_data = self._get_user_row(telegram)
         # If the last done date is already today, do nothing.
-        if last_done_date == current_date_str:
+        if user_data and user_data["lastDoneDate"] == current_date_str:
             return
 
-        # Otherwise, retrieve and increment the user's streak.
-        current_streak_str = self.retrieve_streak(telegram)
-        new_streak = current_streak_str + "1"
-        self.update_points(telegram, streak_to_points(new_streak))
+        try:
+            with self.pool.writer() as cursor:
+                yesterday = current_date - timedelta(days=1)
+                cursor.execute("SELECT 1 FROM Rollovers WHERE Day = ?", (to_day_number(yesterday),))
+                if cursor.fetchone() is None and self._close_day(cursor, yesterday, telegram):
+                    cursor.execute("SELECT * FROM Users WHERE Telegram = ?", (telegram,))
+                    user_data = dict(cursor.fetchone())
+                while True:
+                    if not user_data:
+                        logging.warning(f"⚠️ No user found for Telegram ID: {telegram}")
+                        return
+                    if user_data["lastDoneDate"] == current_date_str:
+                        return
+
+                    # Score the completed day without re-reading the history.
+                    score = score_day(
+                        StreakScore(user_data["BankedPoints"], user_data["SegmentLength"], bool(user_data["PendingMiss"])),
+                        True
+                    )
+
+                    # Update the user's points, streak and last done date in the database.
+                    cursor.execute(
+                        """
+                        UPDATE Users
+                        SET StreakBits = streak_append(StreakBits, 1),
+                            StreakDays = COALESCE(NULLIF(StreakDays, 0), 1) + 1,
+                            CurrentRun = CurrentRun + 1,
+                            LongestRun = MAX(LongestRun, CurrentRun + 1),
+                            BankedPoints = ?, SegmentLength = ?, PendingMiss = ?,
+                            Points = ?,
+                            lastDoneDate = ?,
+                            LastDoneDay = ?
+                        WHERE Telegram = ?
+                          AND lastDoneDate IS ? AND BankedPoints = ? AND SegmentLength = ? AND PendingMiss = ?
+                        """,
+                        (score.banked, score.segment_length, int(score.pending_miss), score.points,
+                         current_date_str, to_day_number(current_date), telegram,
+                         user_data["lastDoneDate"], user_data["BankedPoints"], user_data["SegmentLength"],
+                         user_data["PendingMiss"])
+                    )
+                    if cursor.rowcount:
+                        break
+                    # The row changed since it was read; no other write can change it under the lock.
+                    cursor.execute("SELECT * FROM Users WHERE Telegram = ?", (telegram,))
+                    result = cursor.fetchone()
+                    user_data = dict(result) if result else None
+
+                cursor.execute(
+                    "INSERT OR IGNORE INTO Completions (Telegram, Date) VALUES (?, ?)",
+                    (telegram, current_date_str)
+                )
+                self._update_leaderboard(cursor, telegram, score.points)
+        finally:
+            self.user_cache.invalidate(telegram)
+
+    def get_users_completed_on(self, day: str) -> List[str]:
+        """
+        Retrieves the Telegram IDs of users who completed their habit on a day.
+
+        Args:
+            day: The date in UTC+5, as "YYYY-MM-DD".
+
+        Returns:
+            A list of Telegram IDs, read from the Completions date index.
+        """
+        with self.pool.reader() as cursor:
+            cursor.execute("SELECT Telegram FROM Completions WHERE Date = ?", (day,))
+            return [row["Telegram"] for row in cursor.fetchall()]
+
+    def get_completion_counts(self, start: str, end: str) -> Dict[str, int]:
+        """
+        Counts completions per day between two dates, inclusive.
+
+        Args:
+            start: The first date, as "YYYY-MM-DD".
+            end: The last date, as "YYYY-MM-DD".
+
+        Returns:
+            A dict of date to number of users who completed on it. Days without
+            completions are left out.
+        """
+        with self.pool.reader() as cursor:
+            cursor.execute(
+                "SELECT Date, COUNT(*) AS Completed FROM Completions WHERE Date BETWEEN ? AND ? GROUP BY Date",
+                (start, end)
+            )
+            return {row["Date"]: row["Completed"] for row in cursor.fetchall()}
 
-        # Update the user's streak and last done date in the database.
-        self.cursor.execute("UPDATE Users SET Streak = ? WHERE Telegram = ?", (str(new_streak), telegram))
-        self.cursor.execute("UPDATE Users SET lastDoneDate = ? WHERE Telegram = ?", (current_date_str, telegram))
-        self.con.commit()
-    
     def is_streak_broken(self, telegram):
         year, month, date = self.retrieve_last_done_date(telegram).split("-")
         last_date = datetime(int(year), int(month), int(date), tzinfo=timezone(timedelta(hours=5)))
@@ -236,100 +468,290 @@ class Database:
         else:
             return False
         
+    def load_leaderboard(self):
+        """(Re)loads the in-memory leaderboard from the Users table."""
+        with self._leaderboard_lock:
+            with self.pool.reader() as cursor:
+                # Read the counter first: rows read after it are at least as new,
+                # so a write in between only causes one more reload.
+                version = self._read_leaderboard_version(cursor)
+                cursor.execute("SELECT Telegram, TelegramHandle, Points FROM Users")
+                self.leaderboard.load(cursor.fetchall())
+            self._leaderboard_version = version
+
+    @staticmethod
+    def _read_leaderboard_version(cursor: sqlite3.Cursor) -> int:
+        cursor.execute("SELECT Value FROM Counters WHERE Name = 'leaderboard'")
+        return cursor.fetchone()["Value"]
+
+    def refresh_leaderboard(self):
+        """Reloads the board if any process has changed points or users since it was loaded."""
+        with self.pool.reader() as cursor:
+            version = self._read_leaderboard_version(cursor)
+        if version != self._leaderboard_version:
+            self.load_leaderboard()
+
+    def _update_leaderboard(self, cursor: sqlite3.Cursor, telegram: str, points: int, handle: Optional[str] = None):
+        """
+        Applies this process's own write to the board, inside the write transaction.
+
+        The write's trigger has just bumped the counter. If that is the only
+        change since the board was loaded, the board stays current without a
+        reload; otherwise the next read reloads it.
+        """
+        with self._leaderboard_lock:
+            self.leaderboard.update(telegram, points, handle=handle)
+            version = self._read_leaderboard_version(cursor)
+            if self._leaderboard_version is not None and version == self._leaderboard_version + 1:
+                self._leaderboard_version = version
+
     def get_leaderboard(self):
         """
         Retrieves a leaderboard sorted by points in descending order.
+
+        Served from the in-memory Leaderboard, which costs one query of the
+        change counter, and a reload only after another process changed points.
+
         Returns:
-            A list of sqlite3.Row objects with 'TelegramHandle' and 'Points'.
+            A list of the top 10 entries, each with 'TelegramHandle' and 'Points'.
         """
-        self.cursor.execute("SELECT TelegramHandle, Points FROM Users ORDER BY Points DESC LIMIT 10")
-        return self.cursor.fetchall()
+        self.refresh_leaderboard()
+        return self.leaderboard.top()
+
+    def get_rank(self, telegram: str) -> Optional[int]:
+        """Retrieves a user's 1-based leaderboard rank, or None if they are not registered."""
+        self.refresh_leaderboard()
+        return self.leaderboard.rank(telegram)
+
+    def get_standing(self, telegram: str, neighbours: int = 2) -> Optional[dict]:
+        """
+        Retrieves a user's rank, percentile and leaderboard neighbours.
+
+        See Leaderboard.standing for the shape of the result.
+        """
+        self.refresh_leaderboard()
+        return self.leaderboard.standing(telegram, neighbours)
 
     def update_points(self, telegram: str, points: int):
         """Updates the user's points."""
-        self.cursor.execute("UPDATE Users SET Points = ? WHERE Telegram = ?", (points, telegram))
-        self.con.commit()
+        with self.pool.writer() as cursor:
+            cursor.execute("UPDATE Users SET Points = ? WHERE Telegram = ?", (points, telegram))
+            if cursor.rowcount:
+                self._update_leaderboard(cursor, telegram, points)
+        self.user_cache.invalidate(telegram)
 
     def retrieve_points(self, telegram: str) -> Optional[int]:
         """Retrieves a user's points."""
-        self.cursor.execute("SELECT Points FROM Users WHERE Telegram = ?", (telegram,))
-        result = self.cursor.fetchone()
-        return result["Points"] if result else None
+        user_data = self._get_user_row(telegram)
+        return user_data["Points"] if user_data else None
 
     def add_new_weekly_challenge(self, weeklychallenge: Tuple[str, str, str, str]):
         """Adds a new weekly challenge."""
-        self.cursor.execute("INSERT INTO WeeklyChallenges VALUES (?, ?, ?, ?)", weeklychallenge)
-        self.con.commit()
+        with self.pool.writer() as cursor:
+            cursor.execute("INSERT INTO WeeklyChallenges VALUES (?, ?, ?, ?)", weeklychallenge)
     
     def retrieve_challenge(self, category: str, challenge_number: int) -> Optional[str]:
         """Retrieves a specific challenge from WeeklyChallenges."""
         challenge_column = f"Challenge{challenge_number}"
-        self.cursor.execute(f"SELECT {challenge_column} FROM WeeklyChallenges WHERE Category = ?", (category,))
-        result = self.cursor.fetchone()
+        with self.pool.reader() as cursor:
+            cursor.execute(f"SELECT {challenge_column} FROM WeeklyChallenges WHERE Category = ?", (category,))
+            result = cursor.fetchone()
         return result[challenge_column] if result else None
     
     def add_new_information(self, info: Tuple[int, str]):
         """Adds new informational content."""
-        self.cursor.execute("INSERT INTO Information VALUES (?, ?)", info)
-        self.con.commit()
+        with self.pool.writer() as cursor:
+            cursor.execute("INSERT INTO Information VALUES (?, ?)", info)
     
     def retrieve_information(self, date: int) -> Optional[str]:
         """Retrieves informational content based on date."""
-        self.cursor.execute("SELECT Content FROM Information WHERE Date = ?", (date,))
-        result = self.cursor.fetchone()
+        with self.pool.reader() as cursor:
+            cursor.execute("SELECT Content FROM Information WHERE Date = ?", (date,))
+            result = cursor.fetchone()
         return result["Content"] if result else None
     
-    def update_all_streaks(self):
+    def open_snapshot(self) -> BinaryIO:
+        """
+        Opens a gzip-compressed, consistent copy of the database.
+
+        Snapshots are cached for Config.SNAPSHOT_TTL seconds, so repeated
+        downloads share one backup.
+        """
+        return self.snapshots.open()
+
+    def export(self, table: str, fmt: str = "csv", since: Optional[str] = None) -> Iterator[bytes]:
+        """
+        Streams "users", "reflections" or "completions" as CSV or NDJSON.
+
+        Only rows after the `since` cursor are exported; see export.export_rows.
+
+        Raises:
+            ValueError: If the table, format or cursor is not valid.
+        """
+        return export_rows(self.pool, table, fmt, since)
+
+    def update_all_streaks(self) -> Tuple[int, float]:
         """
         Updates the streak for all users based on their last done date.
         
         The logic assumes:
         - The current time is adjusted to UTC+5 (as in your other methods).
         - If a user's last done date equals yesterday's date (in UTC+5),
-            the streak is incremented.
-        - Otherwise, the streak is reset to "0".
+            the streak is left as is, since the completion already appended "1".
+        - If there is no last done date or it is not a valid date, the streak
+            is reset to "0".
+        - Otherwise, a missed day ("0") is appended to the streak.
+
+        Each day is closed at most once: the closed day is recorded in
+        Rollovers in the same transaction, and a second run for it does
+        nothing. A late run, e.g. one caught up after a restart, also skips
+        users whose Completions show they did the closed day but have already
+        completed again since, and users whose day was already closed by
+        their next completion (see update_streak_if_not_today).
         
+        The classification runs as a single set-based UPDATE inside one
+        transaction, so the cost is one round trip regardless of user count.
+
         This function should be run once daily (e.g., at 3 AM).
+
+        Returns:
+            A tuple of (number of users updated, elapsed seconds).
         """
         # Get current time in UTC+5 and determine yesterday's date.
         current_datetime = datetime.now(UTC) + timedelta(hours=5)
-        yesterday = (current_datetime - timedelta(days=1)).date()
-        
-        # Retrieve all users.
-        self.cursor.execute("SELECT Telegram, lastDoneDate, Streak FROM Users")
-        users = self.cursor.fetchall()
-        
-        for user in users:
-            telegram = user["Telegram"]
-            last_done_date_str = user["lastDoneDate"]
-            new_streak = None
-            if last_done_date_str:
-                try:
-                    last_done_date = datetime.strptime(last_done_date_str, "%Y-%m-%d").date()
-                except ValueError:
-                    # If parsing fails, reset the streak.
-                    new_streak = "0"
-                else:
-                    if last_done_date == yesterday:
-                        # Increment streak if yesterday's challenge was completed.
-                        continue
-                    else:
-                        new_streak = user["Streak"] + "0"
-            else:
-                # No recorded challenge date; treat as streak broken.
-                new_streak = "0"
-            
-            self.cursor.execute(
-                "UPDATE Users SET Streak = ? WHERE Telegram = ?",
-                (str(new_streak), telegram)
+        yesterday_date = (current_datetime - timedelta(days=1)).date()
+        yesterday = to_day_number(yesterday_date)
+
+        start = perf_counter()
+        with self.pool.writer() as cursor:
+            cursor.execute(
+                "INSERT OR IGNORE INTO Rollovers (Day, RanAt) VALUES (?, ?)",
+                (yesterday, datetime.now(UTC).strftime("%Y-%m-%d %H:%M:%S"))
             )
-        self.con.commit()
+            if cursor.rowcount == 0:
+                logging.warning(f"⚠️ Streaks were already updated for {yesterday_date.isoformat()}, skipping")
+                return 0, perf_counter() - start
+            updated = self._close_day(cursor, yesterday_date)
+        self.user_cache.clear()
+        elapsed = perf_counter() - start
+        return updated, elapsed
 
-    def get_all_users(self):
-        self.cursor.execute(
-            "SELECT Telegram FROM Users"
+    @staticmethod
+    def _close_day(cursor: sqlite3.Cursor, day: date, telegram: Optional[str] = None) -> int:
+        """
+        Records `day` as missed for every user, or only `telegram`, who did not complete it.
+
+        Returns:
+            int: The number of users updated.
+        """
+        cursor.execute(
+            MISSED_DAY_UPDATE.format(user_filter="" if telegram is None else "AND Telegram = :telegram"),
+            {"day": to_day_number(day), "day_date": day.isoformat(), "telegram": telegram,
+             "reset_streak": PackedStreak.from_text("0").to_blob()}
         )
-        return [row["Telegram"] for row in self.cursor.fetchall()]
+        return cursor.rowcount
+
+    def acquire_lease(self, name: str, holder: str, ttl: float) -> bool:
+        """
+        Takes or renews a named lease for `ttl` seconds.
+
+        The lease is granted if nobody holds it, `holder` already holds it, or
+        the previous holder let it expire.
+
+        Returns:
+            bool: True if `holder` now holds the lease.
+        """
+        now = datetime.now(timezone.utc).timestamp()
+        with self.pool.writer() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO SchedulerLease (Name, Holder, ExpiresAt) VALUES (?, ?, ?)
+                ON CONFLICT(Name) DO UPDATE SET Holder = excluded.Holder, ExpiresAt = excluded.ExpiresAt
+                WHERE SchedulerLease.Holder = excluded.Holder OR SchedulerLease.ExpiresAt < ?
+                """,
+                (name, holder, now + ttl, now)
+            )
+            return cursor.rowcount == 1
+
+    def release_lease(self, name: str, holder: str):
+        """Gives up a lease if `holder` holds it, so another process can take over at once."""
+        with self.pool.writer() as cursor:
+            cursor.execute("DELETE FROM SchedulerLease WHERE Name = ? AND Holder = ?", (name, holder))
+
+    def get_persisted_data(self, kind: str) -> Dict[str, Tuple[int, str]]:
+        """
+        Retrieves every stored entry of one kind of bot framework data.
+
+        Returns:
+            dict: Maps each key to its (version, JSON data). Deleted entries are left out.
+        """
+        with self.pool.reader() as cursor:
+            cursor.execute("SELECT Key, Version, Data FROM Persistence WHERE Kind = ? AND Data IS NOT NULL", (kind,))
+            return {row["Key"]: (row["Version"], row["Data"]) for row in cursor.fetchall()}
+
+    def get_persisted_entry(self, kind: str, key: str) -> Optional[Tuple[int, Optional[str]]]:
+        """
+        Retrieves one stored entry.
+
+        Returns:
+            tuple or None: (version, JSON data), where the data is None if the
+                entry was deleted, or None if it was never stored.
+        """
+        with self.pool.reader() as cursor:
+            cursor.execute("SELECT Version, Data FROM Persistence WHERE Kind = ? AND Key = ?", (kind, key))
+            row = cursor.fetchone()
+            return (row["Version"], row["Data"]) if row else None
+
+    def get_persisted_entries(self, entries: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], Tuple[int, Optional[str]]]:
+        """
+        Retrieves several stored entries in one query.
+
+        Returns:
+            dict: (version, JSON data) for each stored (kind, key); entries
+                never stored are left out.
+        """
+        entries = list(entries)
+        if not entries:
+            return {}
+        with self.pool.reader() as cursor:
+            cursor.execute(
+                f"""
+                SELECT Kind, Key, Version, Data FROM Persistence
+                WHERE (Kind, Key) IN (VALUES {", ".join("(?, ?)" for _ in entries)})
+                """,
+                [value for entry in entries for value in entry]
+            )
+            return {(row["Kind"], row["Key"]): (row["Version"], row["Data"]) for row in cursor.fetchall()}
+
+    def save_persisted_data(self, entries: Iterable[Tuple[str, str, Optional[str]]]) -> Dict[Tuple[str, str], int]:
+        """
+        Writes (kind, key, JSON data) entries in one transaction.
+
+        Data of None deletes the entry. Every write bumps the entry's version.
+
+        Returns:
+            dict: The new version of each written (kind, key).
+        """
+        versions = {}
+        with self.pool.writer() as cursor:
+            for kind, key, data in entries:
+                cursor.execute(
+                    """
+                    INSERT INTO Persistence (Kind, Key, Data) VALUES (?, ?, ?)
+                    ON CONFLICT(Kind, Key) DO UPDATE SET Data = excluded.Data, Version = Version + 1
+                    RETURNING Version
+                    """,
+                    (kind, key, data)
+                )
+                versions[(kind, key)] = cursor.fetchone()[0]
+        return versions
+
+    def get_all_users(self):
+        with self.pool.reader() as cursor:
+            cursor.execute(
+                "SELECT Telegram FROM Users"
+            )
+            return [row["Telegram"] for row in cursor.fetchall()]
 
     def get_users_streaks_breaking(self):
         """
@@ -342,19 +764,19 @@ class Database:
             A list of Telegram IDs (strings) to remind for challenge completion.
         """
         current_datetime = datetime.now(timezone.utc) + timedelta(hours=5)
-        today_str = current_datetime.date().isoformat()         # "YYYY-MM-DD"
-        yesterday_str = (current_datetime - timedelta(days=1)).date().isoformat()  # "YYYY-MM-DD"
+        today = to_day_number(current_datetime.date())
 
-        # Use SQLite's date() function for proper date comparisons.
-        self.cursor.execute(
-            """
-            SELECT Telegram FROM Users
-            WHERE lastDoneDate IS NULL OR date(TRIM(lastDoneDate)) NOT IN (?, ?)
-            """,
-            (today_str, yesterday_str)
-        )
+        # Each branch is a range scan of idx_users_last_done_day.
+        with self.pool.reader() as cursor:
+            cursor.execute(
+                """
+                SELECT Telegram FROM Users
+                WHERE LastDoneDay IS NULL OR LastDoneDay < ? OR LastDoneDay > ?
+                """,
+                (today - 1, today)
+            )
 
-        return [row["Telegram"] for row in self.cursor.fetchall()]
+            return [row["Telegram"] for row in cursor.fetchall()]
 
     
     def get_users_streaks_broken(self):
@@ -371,20 +793,253 @@ class Database:
         # Adjust current time to UTC+5
         current_datetime = datetime.now(timezone.utc) + timedelta(hours=5)
         # Calculate the cutoff date (today - 2 days)
-        cutoff_date = (current_datetime - timedelta(days=2)).date().isoformat()  # e.g., "2025-03-15"
-        logging.info(cutoff_date)
-        # Use TRIM and date() to ensure proper date conversion and remove any stray spaces.
-        self.cursor.execute(
-            """
-            SELECT Telegram FROM Users
-            WHERE lastDoneDate IS NULL OR date(TRIM(lastDoneDate)) < date(?)
-            """,
-            (cutoff_date,)
-        )
+        cutoff_date = (current_datetime - timedelta(days=2)).date()
+        logging.info(cutoff_date.isoformat())
+        # Both branches are range scans of idx_users_last_done_day.
+        with self.pool.reader() as cursor:
+            cursor.execute(
+                """
+                SELECT Telegram FROM Users
+                WHERE LastDoneDay IS NULL OR LastDoneDay < ?
+                """,
+                (to_day_number(cutoff_date),)
+            )
         
-        return [row["Telegram"] for row in self.cursor.fetchall()]
+            return [row["Telegram"] for row in cursor.fetchall()]
 
-    def close(self):
-        """Closes the database connection."""
-        if self.con:
-            self.con.close()
+    def get_users_reminder_due(self, slot: int, shard: int = 0, shards: int = 1,
+                               after_rowid: int = 0, limit: int = -1) -> List[Tuple[int, str, int]]:
+        """
+        Retrieves the users whose reminder is due at a UTC minute of the day,
+        among those whose last done date is not today or yesterday (in UTC+5).
+
+        Results are in rowid order, so they can be paged by passing the last
+        rowid received as `after_rowid`. With `shards` > 1 only the users
+        whose rowid modulo `shards` equals `shard` are returned.
+
+        Args:
+            slot: The UTC minute of the day, 0 to 1439.
+            shard: Which shard to return, from 0 to shards - 1.
+            shards: The number of shards the users are split into.
+            after_rowid: Only users after this rowid are returned.
+            limit: The page size; -1 for no limit.
+
+        Returns:
+            A list of (rowid, Telegram ID, timezone offset in minutes) tuples.
+        """
+        current_datetime = datetime.now(timezone.utc) + timedelta(hours=5)
+        today = to_day_number(current_datetime.date())
+        with self.pool.reader() as cursor:
+            cursor.execute(
+                """
+                SELECT rowid, Telegram, TzOffsetMinutes FROM Users
+                WHERE ReminderSlot = ? AND rowid > ? AND rowid % ? = ?
+                  AND (LastDoneDay IS NULL OR LastDoneDay < ? OR LastDoneDay > ?)
+                ORDER BY rowid
+                LIMIT ?
+                """,
+                (slot, after_rowid, shards, shard, today - 1, today, limit)
+            )
+            return [tuple(row) for row in cursor.fetchall()]
+
+    def get_users_broken_due(self, slot: int, shard: int = 0, shards: int = 1,
+                             after_rowid: int = 0, limit: int = -1) -> List[Tuple[int, str, int]]:
+        """
+        Retrieves the users whose broken streak message is due at a UTC minute
+        of the day, among those whose last done date is more than 2 days ago.
+
+        Paged and sharded like get_users_reminder_due.
+
+        Returns:
+            A list of (rowid, Telegram ID, timezone offset in minutes) tuples.
+        """
+        current_datetime = datetime.now(timezone.utc) + timedelta(hours=5)
+        cutoff = to_day_number((current_datetime - timedelta(days=2)).date())
+        with self.pool.reader() as cursor:
+            cursor.execute(
+                """
+                SELECT rowid, Telegram, TzOffsetMinutes FROM Users
+                WHERE BrokenStreakSlot = ? AND rowid > ? AND rowid % ? = ?
+                  AND (LastDoneDay IS NULL OR LastDoneDay < ?)
+                ORDER BY rowid
+                LIMIT ?
+                """,
+                (slot, after_rowid, shards, shard, cutoff, limit)
+            )
+            return [tuple(row) for row in cursor.fetchall()]
+
+    def start_job(self, job_key: str, shards: int) -> Dict[int, Tuple[int, bool]]:
+        """
+        Creates the checkpoints of a sharded job, or returns the existing ones.
+
+        Checkpoints untouched for a week are deleted at the same time.
+
+        Returns:
+            A dict of shard to (last rowid queued, whether the shard is done).
+            A job that already exists keeps the shard count it started with.
+        """
+        now = datetime.now(timezone.utc)
+        updated_at_str = now.strftime("%Y-%m-%d %H:%M:%S")
+        expired_str = (now - timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
+        with self.pool.writer() as cursor:
+            cursor.execute("DELETE FROM JobCheckpoints WHERE UpdatedAt < ?", (expired_str,))
+            cursor.executemany(
+                "INSERT OR IGNORE INTO JobCheckpoints (JobKey, Shard, UpdatedAt) VALUES (?, ?, ?)",
+                ((job_key, shard, updated_at_str) for shard in range(shards))
+            )
+            cursor.execute("SELECT Shard, LastRowId, Done FROM JobCheckpoints WHERE JobKey = ?", (job_key,))
+            return {row["Shard"]: (row["LastRowId"], bool(row["Done"])) for row in cursor.fetchall()}
+
+    def complete_job_shard(self, job_key: str, shard: int):
+        """Marks a shard of a job as done."""
+        updated_at_str = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        with self.pool.writer() as cursor:
+            cursor.execute(
+                "UPDATE JobCheckpoints SET Done = 1, UpdatedAt = ? WHERE JobKey = ? AND Shard = ?",
+                (updated_at_str, job_key, shard)
+            )
+
+    def get_counter(self, name: str) -> Optional[int]:
+        """Retrieves a named value from the Counters table, or None if it was never set."""
+        with self.pool.reader() as cursor:
+            cursor.execute("SELECT Value FROM Counters WHERE Name = ?", (name,))
+            row = cursor.fetchone()
+            return row["Value"] if row else None
+
+    def set_counter(self, name: str, value: int):
+        """Stores a named value in the Counters table."""
+        with self.pool.writer() as cursor:
+            cursor.execute(
+                "INSERT INTO Counters (Name, Value) VALUES (?, ?) ON CONFLICT(Name) DO UPDATE SET Value = excluded.Value",
+                (name, value)
+            )
+
+    def create_broadcast(self, text: Optional[str], recipients: Iterable,
+                         checkpoint: Optional[Tuple[str, int, int]] = None) -> int:
+        """
+        Records a broadcast and queues one Outbox row per recipient.
+
+        Broadcasts finished more than Config.OUTBOX_RETENTION_DAYS days ago are
+        deleted with their Outbox rows at the same time.
+
+        Args:
+            text: The message, or None if every recipient has its own text.
+            recipients: Telegram IDs, or (Telegram ID, text) pairs to override
+                the text per recipient. Duplicate recipients are queued once.
+            checkpoint: An optional (job key, shard, last rowid) saved to
+                JobCheckpoints in the same transaction, so a job resumed after
+                a crash never queues the same recipients twice.
+
+        Returns:
+            int: The new broadcast's ID.
+        """
+        now = datetime.now(timezone.utc)
+        created_at_str = now.strftime("%Y-%m-%d %H:%M:%S")
+        expired_str = (now - timedelta(days=Config.OUTBOX_RETENTION_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+        with self.pool.writer() as cursor:
+            cursor.execute(
+                "DELETE FROM Outbox WHERE BroadcastId IN (SELECT id FROM Broadcasts WHERE CompletedAt < ?)",
+                (expired_str,)
+            )
+            cursor.execute("DELETE FROM Broadcasts WHERE CompletedAt < ?", (expired_str,))
+            cursor.execute("INSERT INTO Broadcasts (Text, CreatedAt) VALUES (?, ?)", (text, created_at_str))
+            broadcast_id = cursor.lastrowid
+            cursor.executemany(
+                """
+                INSERT OR IGNORE INTO Outbox (BroadcastId, Telegram, Text, UpdatedAt)
+                VALUES (?, ?, ?, ?)
+                """,
+                (
+                    (broadcast_id, str(recipient[0]), recipient[1], created_at_str)
+                    if isinstance(recipient, tuple)
+                    else (broadcast_id, str(recipient), None, created_at_str)
+                    for recipient in recipients
+                )
+            )
+            if checkpoint is not None:
+                job_key, shard, last_rowid = checkpoint
+                cursor.execute(
+                    "UPDATE JobCheckpoints SET LastRowId = ?, UpdatedAt = ? WHERE JobKey = ? AND Shard = ?",
+                    (last_rowid, created_at_str, job_key, shard)
+                )
+        return broadcast_id
+
+    def claim_outbox_batch(self, limit: int) -> List[Tuple[int, str, str]]:
+        """
+        Marks up to `limit` pending Outbox rows as sending and returns them.
+
+        Returns:
+            A list of (BroadcastId, Telegram, text) tuples, oldest broadcast first.
+        """
+        with self.pool.writer() as cursor:
+            # One statement, so a row can only be claimed while it is pending.
+            cursor.execute(
+                """
+                UPDATE Outbox SET Status = 'sending', Attempts = Attempts + 1, UpdatedAt = datetime('now')
+                WHERE Status = 'pending' AND rowid IN (
+                    SELECT rowid FROM Outbox WHERE Status = 'pending' ORDER BY BroadcastId LIMIT ?
+                )
+                RETURNING BroadcastId, Telegram,
+                    COALESCE(Text, (SELECT b.Text FROM Broadcasts b WHERE b.id = Outbox.BroadcastId)) AS Text
+                """,
+                (limit,)
+            )
+            batch = [(row["BroadcastId"], row["Telegram"], row["Text"]) for row in cursor.fetchall()]
+        # RETURNING yields rows in no particular order.
+        batch.sort(key=lambda row: row[0])
+        return batch
+
+    def complete_outbox_batch(self, results: Iterable[Tuple[int, str, bool]]):
+        """
+        Records the outcome of claimed Outbox rows.
+
+        Args:
+            results: (BroadcastId, Telegram, sent) tuples.
+        """
+        results = list(results)
+        with self.pool.writer() as cursor:
+            cursor.executemany(
+                """
+                UPDATE Outbox SET Status = ?, UpdatedAt = datetime('now')
+                WHERE BroadcastId = ? AND Telegram = ?
+                """,
+                (("sent" if sent else "failed", broadcast_id, telegram) for broadcast_id, telegram, sent in results)
+            )
+            # Close the batch's broadcasts that have nothing left to send.
+            cursor.executemany(
+                """
+                UPDATE Broadcasts SET CompletedAt = datetime('now')
+                WHERE id = ? AND CompletedAt IS NULL AND NOT EXISTS (
+                    SELECT 1 FROM Outbox o
+                    WHERE o.BroadcastId = Broadcasts.id AND o.Status IN ('pending', 'sending')
+                )
+                """,
+                ((broadcast_id,) for broadcast_id in {broadcast_id for broadcast_id, _, _ in results})
+            )
+
+    def requeue_inflight_outbox(self, timeout: float) -> int:
+        """
+        Returns rows left in 'sending' by a process that stopped mid-send to 'pending'.
+
+        Only rows claimed more than `timeout` seconds ago are requeued, so rows
+        another process is still sending are left alone. At most one in-flight
+        batch per stopped process can be delivered twice.
+
+        Returns:
+            int: The number of rows requeued.
+        """
+        with self.pool.writer() as cursor:
+            cursor.execute(
+                "UPDATE Outbox SET Status = 'pending' WHERE Status = 'sending' AND UpdatedAt < datetime('now', ?)",
+                (f"-{float(timeout)} seconds",)
+            )
+            return cursor.rowcount
+
+    def get_broadcast_status(self, broadcast_id: int) -> dict:
+        """Counts a broadcast's Outbox rows by status, e.g. {'sent': 120, 'failed': 3}."""
+        with self.pool.reader() as cursor:
+            cursor.execute(
+                "SELECT Status, COUNT(*) AS Count FROM Outbox WHERE BroadcastId = ? GROUP BY Status",
+                (broadcast_id,)
+            )
+            return {row["Status"]: row["Count"] for row in cursor.fetchall()}
@@ -1,4 +1,195 @@
-def streak_to_points(streak: str) -> int:
+import re
+import struct
+from datetime import date, timedelta
+from typing import Iterator, NamedTuple, Optional, Tuple, Union
+
+# Text rendering of every byte value, most significant bit first.
+_BYTE_TO_TEXT = [format(value, "08b") for value in range(256)]
+
+
+class PackedStreak:
+    """
+    A user's day-by-day history packed one bit per day.
+
+    Stored as a BLOB made of a 4-byte big-endian day count followed by the
+    bits, most significant bit first. Bit i is day i of the history, with '1'
+    meaning the habit was completed and '0' a missed day, exactly like the old
+    text column.
+    """
+    HEADER = struct.Struct(">I")
+
+    def __init__(self, length: int = 0, data: Optional[bytes] = None):
+        self.length = length
+        self.data = bytearray(data or b"")
+
+    @classmethod
+    def from_text(cls, streak: str) -> "PackedStreak":
+        """Packs a string of '0's and '1's."""
+        packed = cls()
+        for ch in streak:
+            packed.append(ch == "1")
+        return packed
+
+    @classmethod
+    def from_blob(cls, blob: Optional[bytes]) -> "PackedStreak":
+        """Unpacks a BLOB produced by to_blob(). An empty BLOB is an empty streak."""
+        if not blob:
+            return cls()
+        (length,) = cls.HEADER.unpack_from(blob)
+        return cls(length, blob[cls.HEADER.size:])
+
+    def to_blob(self) -> bytes:
+        return self.HEADER.pack(self.length) + bytes(self.data)
+
+    def append(self, completed: bool):
+        """Records one more day at the end of the history."""
+        if self.length % 8 == 0:
+            self.data.append(0)
+        if completed:
+            self.data[-1] |= 0x80 >> (self.length % 8)
+        self.length += 1
+
+    def current_run(self) -> int:
+        """Number of consecutive completed days at the end of the history."""
+        text = str(self)
+        return len(text) - len(text.rstrip("1"))
+
+    def longest_run(self) -> int:
+        """Longest number of consecutive completed days in the history."""
+        return max((len(run) for run in str(self).split("0")), default=0)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __str__(self) -> str:
+        return "".join(_BYTE_TO_TEXT[value] for value in self.data)[:self.length]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, PackedStreak):
+            return self.length == other.length and self.data == other.data
+        return NotImplemented
+
+
+def streak_append(blob: Optional[bytes], completed: int) -> bytes:
+    """
+    SQLite function appending one day to a packed streak BLOB.
+
+    A NULL BLOB is treated as the initial "0" streak, matching retrieve_streak.
+    """
+    packed = PackedStreak.from_blob(blob) if blob else PackedStreak.from_text("0")
+    packed.append(bool(completed))
+    return packed.to_blob()
+
+
+# Day numbers count days since this date, on the UTC+5 calendar used for lastDoneDate.
+DAY_EPOCH = date(1970, 1, 1)
+
+
+def to_day_number(value: Union[str, date, None]) -> Optional[int]:
+    """
+    Converts a "YYYY-MM-DD" string or date to its day number.
+
+    Returns:
+        The number of days since DAY_EPOCH, or None if the value is empty or
+        not a valid date.
+    """
+    if isinstance(value, str):
+        try:
+            value = date.fromisoformat(value.strip())
+        except ValueError:
+            return None
+    if value is None:
+        return None
+    return (value - DAY_EPOCH).days
+
+
+MINUTES_PER_DAY = 24 * 60
+# Users without a timezone of their own are on the UTC+5 calendar the streaks use.
+DEFAULT_TZ_OFFSET_MINUTES = 5 * 60
+# Local times of day, in minutes after midnight, used when TimePeriod gives none.
+DEFAULT_REMINDER_MINUTE = 17 * 60
+BROKEN_STREAK_MINUTE = 5 * 60
+
+_CLOCK_TIME = re.compile(r"\b(\d{1,2})(?:[:.](\d{2}))?\s*([ap]\.?m\.?)?(?![\w.])", re.IGNORECASE)
+# Checked in order as substrings, so a word must come before any word it contains
+# ("afternoon" before "noon").
+_TIME_WORDS = [
+    ("morning", 8 * 60), ("afternoon", 14 * 60), ("noon", 12 * 60), ("lunch", 12 * 60),
+    ("evening", 18 * 60), ("dinner", 19 * 60), ("night", 21 * 60), ("bed", 22 * 60),
+]
+
+
+def parse_time_of_day(text: Optional[str]) -> Optional[int]:
+    """
+    Finds a time of day in free text such as an onboarding TimePeriod.
+
+    Understands clock times ("7am", "7:30 pm", "19:30") and words such as
+    "morning" or "after dinner". A bare number is not taken as a time.
+
+    Returns:
+        Minutes after midnight, or None if no time was found.
+    """
+    if not text:
+        return None
+    for match in _CLOCK_TIME.finditer(text):
+        hour, minute, meridiem = int(match[1]), int(match[2] or 0), match[3]
+        if match[2] is None and meridiem is None:
+            continue
+        if meridiem:
+            if not 1 <= hour <= 12:
+                continue
+            hour = hour % 12 + (12 if meridiem[0].lower() == "p" else 0)
+        if hour < 24 and minute < 60:
+            return hour * 60 + minute
+    lowered = text.lower()
+    for word, minute in _TIME_WORDS:
+        if word in lowered:
+            return minute
+    return None
+
+
+def to_utc_slot(local_minute: int, tz_offset_minutes: int) -> int:
+    """Converts a local time of day to the UTC minute of the day it falls on."""
+    return (local_minute - tz_offset_minutes) % MINUTES_PER_DAY
+
+
+def local_hour(utc_slot: int, tz_offset_minutes: int) -> int:
+    """Returns the local hour at a UTC minute of the day."""
+    return (utc_slot + tz_offset_minutes) % MINUTES_PER_DAY // 60
+
+
+def reminder_slots(time_period: Optional[str], tz_offset_minutes: int) -> Tuple[int, int]:
+    """
+    Returns a user's (ReminderSlot, BrokenStreakSlot): the UTC minutes of the
+    day at which they get the reminder and the broken streak message.
+    """
+    reminder_minute = parse_time_of_day(time_period)
+    if reminder_minute is None:
+        reminder_minute = DEFAULT_REMINDER_MINUTE
+    return to_utc_slot(reminder_minute, tz_offset_minutes), to_utc_slot(BROKEN_STREAK_MINUTE, tz_offset_minutes)
+
+
+def completion_dates(streak: Union[str, PackedStreak], last_done_date: str) -> Iterator[Tuple[str, bool]]:
+    """
+    Dates every day of a history.
+
+    The history has one bit per day but no dates, so its last completed day is
+    aligned to `last_done_date` ("YYYY-MM-DD"). Yields nothing for a history
+    without completions.
+
+    Yields:
+        ("YYYY-MM-DD", completed) pairs, oldest first.
+    """
+    bits = str(streak)
+    last_one = bits.rfind("1")
+    if last_one < 0:
+        return
+    first_day = date.fromisoformat(last_done_date) - timedelta(days=last_one)
+    for offset, bit in enumerate(bits):
+        yield (first_day + timedelta(days=offset)).isoformat(), bit == "1"
+
+
+def streak_to_points(streak: Union[str, PackedStreak]) -> int:
     """
     Calculates points for a streak based on:
     - A streak is broken by two consecutive '0's.
@@ -6,24 +197,72 @@ def streak_to_points(streak: str) -> int:
     - A consecutive '1' does not add extra points.
 
     Args:
-        streak (str): A string of '1's and '0's representing user activity.
+        streak (str | PackedStreak): A string of '1's and '0's representing
+            user activity, or its packed form.
 
     Returns:
         int: Total streak points.
     """
-    segments = streak.split("00")
+    segments = str(streak).split("00")
     total_points = 0
-    
+
     for segment in segments:
         if not segment:  # Skip empty segments.
             continue
         # Calculate the number of 2-day windows in this segment.
         # Using ceiling division: (len(segment) + 1) // 2
         windows = (len(segment) + 1) // 2
-        
+
         # The points for this segment is the triangular number T(windows)
         segment_points = windows * (windows + 1) // 2
-        
+
         total_points += segment_points
-    
-    return total_points
\ No newline at end of file
+
+    return total_points
+
+
+class StreakScore(NamedTuple):
+    """
+    Running state that lets points be updated one day at a time.
+
+    streak_to_points splits the history on "00" from left to right, so only
+    the segment after the last split can still change. `banked` holds the
+    points of all closed segments, `segment_length` the length of the open
+    one, and `pending_miss` whether the open segment ends in a '0' that the
+    next '0' would pair with to close it.
+    """
+    banked: int = 0
+    segment_length: int = 0
+    pending_miss: bool = False
+
+    @property
+    def points(self) -> int:
+        return self.banked + _segment_points(self.segment_length)
+
+
+def _segment_points(length: int) -> int:
+    """Triangular number of the 2-day windows in a segment of `length` days."""
+    windows = (length + 1) // 2
+    return windows * (windows + 1) // 2
+
+
+def score_day(score: StreakScore, completed: bool) -> StreakScore:
+    """
+    Advances a StreakScore by one day in O(1).
+
+    Folding this over a history gives the same points as streak_to_points.
+    """
+    if completed:
+        return StreakScore(score.banked, score.segment_length + 1, False)
+    if score.pending_miss:
+        # The trailing '0' and this one form the "00" separator.
+        return StreakScore(score.banked + _segment_points(score.segment_length - 1), 0, False)
+    return StreakScore(score.banked, score.segment_length + 1, True)
+
+
+def score_streak(streak: Union[str, PackedStreak]) -> StreakScore:
+    """Builds the StreakScore for a whole history."""
+    score = StreakScore()
+    for ch in str(streak):
+        score = score_day(score, ch == "1")
+    return score
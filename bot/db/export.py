@@ -0,0 +1,176 @@
+import csv
+import io
+from datetime import date
+from typing import Iterator, List, NamedTuple, Optional
+import orjson
+from .db_utils import PackedStreak, completion_dates
+from .pool import ConnectionPool
+
+
+class ExportTable(NamedTuple):
+    """
+    An exportable table, read in keyset order.
+
+    `query` selects one batch of rows whose cursor column is greater than the
+    `:since` parameter, ordered by that column and limited to `:limit` rows.
+    `cursor` names the column holding each row's cursor value, so a client
+    can pass the last one it received as `since` to fetch only newer rows.
+    """
+    columns: List[str]
+    cursor: str
+    query: str
+
+
+EXPORT_TABLES = {
+    "users": ExportTable(
+        columns=["RowId", "Telegram", "TelegramHandle", "Habit", "Location", "TimePeriod",
+                 "ReflectionConsent", "lastDoneDate", "StreakDays", "CurrentRun", "LongestRun",
+                 "Points", "Category"],
+        cursor="RowId",
+        query="""
+            SELECT rowid AS RowId, Telegram, TelegramHandle, Habit, Location, TimePeriod,
+                   ReflectionConsent, lastDoneDate, StreakDays, CurrentRun, LongestRun, Points, Category
+            FROM Users
+            WHERE rowid > :since
+            ORDER BY rowid
+            LIMIT :limit
+        """,
+    ),
+    "reflections": ExportTable(
+        columns=["id", "Telegram", "Reflection", "CreatedAt"],
+        cursor="id",
+        query="""
+            SELECT id, Telegram, Reflection, CreatedAt
+            FROM Reflections
+            WHERE id > :since
+            ORDER BY id
+            LIMIT :limit
+        """,
+    ),
+}
+
+COMPLETION_COLUMNS = ["Telegram", "Date", "Completed"]
+
+# Users whose history can be dated, read in the same keyset order as the users export.
+COMPLETION_USERS_QUERY = """
+    SELECT rowid AS RowId, Telegram, StreakBits, lastDoneDate
+    FROM Users
+    WHERE rowid > :since AND StreakBits IS NOT NULL AND date(lastDoneDate) IS NOT NULL
+    ORDER BY rowid
+    LIMIT :limit
+"""
+
+# Completed days after a (Date, Telegram) cursor, in the order of idx_completions_date.
+# Telegram IDs are never empty, so an empty Telegram starts at the first row of the date.
+COMPLETION_LOG_QUERY = """
+    SELECT Telegram, Date, 1 AS Completed
+    FROM Completions
+    WHERE (Date, Telegram) > (:date, :telegram)
+    ORDER BY Date, Telegram
+    LIMIT :limit
+"""
+
+
+def _iter_batches(pool: ConnectionPool, query: str, cursor_column: str, since, batch_size: int) -> Iterator[List[dict]]:
+    """
+    Yields the rows after `since` in batches of at most `batch_size`.
+
+    Each batch borrows a pooled reader only while it is fetched, so a slow
+    client never holds a connection, and only one batch is in memory at once.
+    """
+    while True:
+        with pool.reader() as cursor:
+            cursor.execute(query, {"since": since, "limit": batch_size})
+            rows = [dict(row) for row in cursor.fetchall()]
+        if not rows:
+            return
+        yield rows
+        since = rows[-1][cursor_column]
+
+
+def _iter_completion_batches(pool: ConnectionPool, batch_size: int) -> Iterator[List[dict]]:
+    """Yields every user's per-day rows, completed and missed, a batch of users at a time."""
+    for batch in _iter_batches(pool, COMPLETION_USERS_QUERY, "RowId", 0, batch_size):
+        rows = []
+        for user in batch:
+            for day, completed in completion_dates(PackedStreak.from_blob(user["StreakBits"]), user["lastDoneDate"]):
+                rows.append({"Telegram": user["Telegram"], "Date": day, "Completed": int(completed)})
+        if rows:
+            yield rows
+
+
+def _iter_completion_log_batches(pool: ConnectionPool, since: str, batch_size: int) -> Iterator[List[dict]]:
+    """Yields the completed days on and after the `since` date from the Completions log."""
+    date_cursor, telegram_cursor = since, ""
+    while True:
+        with pool.reader() as cursor:
+            cursor.execute(COMPLETION_LOG_QUERY, {"date": date_cursor, "telegram": telegram_cursor, "limit": batch_size})
+            rows = [dict(row) for row in cursor.fetchall()]
+        if not rows:
+            return
+        yield rows
+        date_cursor, telegram_cursor = rows[-1]["Date"], rows[-1]["Telegram"]
+
+
+def _to_csv(columns: List[str], batches: Iterator[List[dict]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _to_ndjson(batches: Iterator[List[dict]]) -> Iterator[bytes]:
+    for rows in batches:
+        yield b"".join(orjson.dumps(row) + b"\n" for row in rows)
+
+
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def export_rows(pool: ConnectionPool, table: str, fmt: str = "csv", since: Optional[str] = None,
+                batch_size: int = 1000) -> Iterator[bytes]:
+    """
+    Streams a table as CSV or NDJSON, one encoded chunk per batch.
+
+    `table` is "users", "reflections" or "completions". `since` is a cursor
+    from a previous export: the last RowId for users, the last id for
+    reflections, or the last "YYYY-MM-DD" date for completions. Only later
+    rows are exported, except that a completions export re-sends the whole
+    `since` date. Memory use does not depend on the table size.
+
+    A full completions export rebuilds every user's history, so it includes
+    missed days (Completed 0). With `since` it reads only the newer rows of
+    the indexed Completions log instead, which has no rows for missed days,
+    so an incremental export holds completed days only. Users keep
+    completing the current day after an export, and the log does not record
+    when each row was added, so those rows can only be caught by sending the
+    date again. Rows already received for that date are therefore
+    duplicated; clients should key completions on (Telegram, Date).
+
+    The arguments are validated before the generator is returned, so callers
+    can report bad requests before streaming starts.
+
+    Raises:
+        ValueError: If the table, format or cursor is not valid.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if table == "completions":
+        columns = COMPLETION_COLUMNS
+        if since is None:
+            batches = _iter_completion_batches(pool, batch_size)
+        else:
+            batches = _iter_completion_log_batches(pool, date.fromisoformat(since).isoformat(), batch_size)
+    elif table in EXPORT_TABLES:
+        spec = EXPORT_TABLES[table]
+        columns = spec.columns
+        batches = _iter_batches(pool, spec.query, spec.cursor, 0 if since is None else int(since), batch_size)
+    else:
+        raise ValueError(f"Unknown export table: {table}")
+    return _to_csv(columns, batches) if fmt == "csv" else _to_ndjson(batches)
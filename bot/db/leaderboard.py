@@ -0,0 +1,118 @@
+import threading
+from bisect import bisect_left
+from typing import Iterable, List, Optional
+
+
+class Leaderboard:
+    """
+    In-memory copy of every user's points, kept sorted.
+
+    Database loads it once and updates it after every write that changes
+    points, so /leaderboard never has to query the Users table. Entries are
+    kept as (-points, telegram) tuples in ascending order, which puts the
+    highest points first and lets a user's rank be found by binary search.
+    """
+
+    def __init__(self, top_size: int = 10):
+        self.top_size = top_size
+        self.version = 0  # Bumped whenever the top entries change.
+        self._lock = threading.Lock()
+        self._entries = []
+        self._users = {}  # telegram -> (handle, points)
+
+    def load(self, rows: Iterable):
+        """Replaces the contents with (Telegram, TelegramHandle, Points) rows."""
+        with self._lock:
+            self._users = {str(row[0]): (row[1], row[2] or 0) for row in rows}
+            self._entries = sorted((-points, telegram) for telegram, (_, points) in self._users.items())
+            self.version += 1
+
+    def update(self, telegram: str, points: int, handle: Optional[str] = None):
+        """Inserts a user or moves them to their new points."""
+        telegram = str(telegram)
+        points = points or 0
+        with self._lock:
+            old_position = None
+            if telegram in self._users:
+                old_handle, old_points = self._users[telegram]
+                handle = handle if handle is not None else old_handle
+                if old_points == points and old_handle == handle:
+                    return
+                old_position = bisect_left(self._entries, (-old_points, telegram))
+                del self._entries[old_position]
+            new_position = bisect_left(self._entries, (-points, telegram))
+            self._entries.insert(new_position, (-points, telegram))
+            self._users[telegram] = (handle, points)
+            if new_position < self.top_size or (old_position is not None and old_position < self.top_size):
+                self.version += 1
+
+    def top(self) -> List[dict]:
+        """
+        Returns the top entries, highest points first.
+
+        Each entry has 'TelegramHandle' and 'Points' keys, like the rows of
+        the SQL query it replaces.
+        """
+        with self._lock:
+            return [
+                {"TelegramHandle": self._users[telegram][0], "Points": -negated_points}
+                for negated_points, telegram in self._entries[:self.top_size]
+            ]
+
+    def rank(self, telegram: str) -> Optional[int]:
+        """
+        Returns the user's 1-based rank, or None if they are not on the board.
+
+        Users with equal points share a rank, as in format_leaderboard_message.
+        Runs in O(log n).
+        """
+        with self._lock:
+            user = self._users.get(str(telegram))
+            if user is None:
+                return None
+            return self._rank_of(user[1])
+
+    def standing(self, telegram: str, neighbours: int = 2) -> Optional[dict]:
+        """
+        Returns where a user stands, or None if they are not on the board.
+
+        The result has the user's 'points', their tied 'rank', the 'total'
+        number of users, the 'percentile' of users with fewer points, and up to
+        `neighbours` entries on each side in 'above' and 'below'. Each entry
+        has 'Telegram', 'TelegramHandle', 'Points' and 'Rank'. Runs in
+        O(neighbours * log n).
+        """
+        with self._lock:
+            user = self._users.get(str(telegram))
+            if user is None:
+                return None
+            points = user[1]
+            position = bisect_left(self._entries, (-points, str(telegram)))
+            total = len(self._entries)
+            # (-points + 1,) sorts after every entry with these points, since points are integers.
+            fewer_points = total - bisect_left(self._entries, (-points + 1,))
+            return {
+                "points": points,
+                "rank": self._rank_of(points),
+                "total": total,
+                "percentile": 100 * fewer_points / total,
+                "above": [self._entry(i) for i in range(max(0, position - neighbours), position)],
+                "below": [self._entry(i) for i in range(position + 1, min(total, position + 1 + neighbours))],
+            }
+
+    def _rank_of(self, points: int) -> int:
+        # A 1-tuple sorts before every entry with the same points, so this
+        # counts the users with strictly more points.
+        return bisect_left(self._entries, (-points,)) + 1
+
+    def _entry(self, position: int) -> dict:
+        negated_points, telegram = self._entries[position]
+        return {
+            "Telegram": telegram,
+            "TelegramHandle": self._users[telegram][0],
+            "Points": -negated_points,
+            "Rank": self._rank_of(-negated_points),
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
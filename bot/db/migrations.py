@@ -0,0 +1,509 @@
+import sqlite3
+import logging
+from .db_utils import DEFAULT_TZ_OFFSET_MINUTES, PackedStreak, completion_dates, reminder_slots, score_streak
+
+
+def _pack_text_streaks(cursor: sqlite3.Cursor):
+    """Converts every Users.Streak string into the packed BLOB and its summary fields."""
+    cursor.execute("SELECT Telegram, Streak FROM Users WHERE Streak IS NOT NULL")
+    rows = []
+    for telegram, streak in cursor.fetchall():
+        packed = PackedStreak.from_text(streak or "0")
+        rows.append((packed.to_blob(), len(packed), packed.current_run(), packed.longest_run(), telegram))
+    cursor.executemany(
+        "UPDATE Users SET StreakBits = ?, StreakDays = ?, CurrentRun = ?, LongestRun = ?, Streak = NULL WHERE Telegram = ?",
+        rows
+    )
+
+
+def _score_packed_streaks(cursor: sqlite3.Cursor):
+    """Seeds the incremental scoring state from every user's packed history."""
+    cursor.execute("SELECT Telegram, StreakBits FROM Users")
+    rows = []
+    for telegram, streak_bits in cursor.fetchall():
+        packed = PackedStreak.from_blob(streak_bits) if streak_bits else PackedStreak.from_text("0")
+        score = score_streak(packed)
+        rows.append((score.banked, score.segment_length, int(score.pending_miss), telegram))
+    cursor.executemany(
+        "UPDATE Users SET BankedPoints = ?, SegmentLength = ?, PendingMiss = ? WHERE Telegram = ?",
+        rows
+    )
+
+
+def _backfill_completions(cursor: sqlite3.Cursor):
+    """Writes a Completions row for every completed day in the packed histories."""
+    cursor.execute(
+        "SELECT Telegram, StreakBits, lastDoneDate FROM Users "
+        "WHERE StreakBits IS NOT NULL AND date(lastDoneDate) IS NOT NULL"
+    )
+    for telegram, streak_bits, last_done_date in cursor.fetchall():
+        cursor.executemany(
+            "INSERT OR IGNORE INTO Completions (Telegram, Date) VALUES (?, ?)",
+            (
+                (telegram, day)
+                for day, completed in completion_dates(PackedStreak.from_blob(streak_bits), last_done_date.strip())
+                if completed
+            )
+        )
+
+
+def _assign_reminder_slots(cursor: sqlite3.Cursor):
+    """Schedules every user's messages from their TimePeriod in the default timezone."""
+    cursor.execute("SELECT Telegram, TimePeriod FROM Users")
+    cursor.executemany(
+        "UPDATE Users SET ReminderSlot = ?, BrokenStreakSlot = ? WHERE Telegram = ?",
+        [reminder_slots(time_period, DEFAULT_TZ_OFFSET_MINUTES) + (telegram,)
+         for telegram, time_period in cursor.fetchall()]
+    )
+
+
+def _recompute_reminder_slots(cursor: sqlite3.Cursor):
+    """Recomputes every user's slots from their TimePeriod and their own timezone."""
+    cursor.execute("SELECT Telegram, TimePeriod, TzOffsetMinutes FROM Users")
+    cursor.executemany(
+        "UPDATE Users SET ReminderSlot = ?, BrokenStreakSlot = ? WHERE Telegram = ?",
+        [reminder_slots(time_period, tz_offset_minutes) + (telegram,)
+         for telegram, time_period, tz_offset_minutes in cursor.fetchall()]
+    )
+
+
+def _record_closed_days(cursor: sqlite3.Cursor):
+    """
+    Sets each user's ClosedDay to the last day their history covers.
+
+    A history's last completed day is LastDoneDay (see completion_dates), and
+    every missed day after it was closed by a rollover. A history without
+    completions starts with the placeholder day before sign-up, which is
+    LastDoneDay. Whether the rollover for yesterday has run yet is read from
+    each history rather than assumed, so a rollover still due after the
+    migration closes the day as usual.
+    """
+    cursor.execute("SELECT Telegram, StreakBits, LastDoneDay FROM Users WHERE LastDoneDay IS NOT NULL")
+    rows = []
+    for telegram, streak_bits, last_done_day in cursor.fetchall():
+        bits = str(PackedStreak.from_blob(streak_bits))
+        if "1" in bits:
+            closed_day = last_done_day + len(bits) - len(bits.rstrip("0"))
+        elif bits:
+            closed_day = last_done_day + len(bits) - 1
+        else:
+            continue
+        if closed_day > last_done_day:
+            rows.append((closed_day, telegram))
+    cursor.executemany("UPDATE Users SET ClosedDay = ? WHERE Telegram = ?", rows)
+
+
+# Ordered list of (version, description, steps). Each step is either an SQL
+# statement or a callable taking a cursor, for data migrations that need Python.
+# The applied version is stored in SQLite's `PRAGMA user_version`, so only
+# migrations newer than the database are run. Never edit a released migration;
+# append a new one instead.
+MIGRATIONS = [
+    (1, "Create base tables", [
+        """
+        CREATE TABLE IF NOT EXISTS Users (
+            Telegram TEXT PRIMARY KEY,
+            TelegramHandle TEXT,
+            Habit TEXT,
+            Location TEXT,
+            TimePeriod TEXT,
+            ReflectionConsent INTEGER,
+            lastDoneDate TEXT,
+            Streak TEXT,
+            Points INTEGER,
+            Category TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS WeeklyChallenges (
+            Category TEXT PRIMARY KEY,
+            Challenge1 TEXT,
+            Challenge2 TEXT,
+            Challenge3 TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS Information (
+            Date INTEGER PRIMARY KEY,
+            Content TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS Reflections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            Telegram TEXT,
+            Reflection TEXT,
+            CreatedAt TEXT,
+            FOREIGN KEY (Telegram) REFERENCES Users(Telegram)
+        )
+        """,
+    ]),
+    # Users.Streak grew by one character per day forever. The history is now a
+    # bit-packed BLOB (see db_utils.PackedStreak) with cached run summaries.
+    # The old column is emptied rather than dropped so this also runs on
+    # SQLite versions without ALTER TABLE ... DROP COLUMN.
+    (2, "Pack streak history into a BLOB with run summaries", [
+        "ALTER TABLE Users ADD COLUMN StreakBits BLOB",
+        "ALTER TABLE Users ADD COLUMN StreakDays INTEGER DEFAULT 0",
+        "ALTER TABLE Users ADD COLUMN CurrentRun INTEGER DEFAULT 0",
+        "ALTER TABLE Users ADD COLUMN LongestRun INTEGER DEFAULT 0",
+        _pack_text_streaks,
+    ]),
+    # Running state for db_utils.score_day, so points are updated in O(1) per
+    # day instead of re-scanning the whole history.
+    (3, "Add incremental scoring state", [
+        "ALTER TABLE Users ADD COLUMN BankedPoints INTEGER DEFAULT 0",
+        "ALTER TABLE Users ADD COLUMN SegmentLength INTEGER DEFAULT 0",
+        "ALTER TABLE Users ADD COLUMN PendingMiss INTEGER DEFAULT 0",
+        _score_packed_streaks,
+    ]),
+    (4, "Index Users by points", [
+        "CREATE INDEX IF NOT EXISTS idx_users_points ON Users(Points DESC)",
+    ]),
+    # Durable outbox so broadcasts survive restarts. Outbox.Text overrides the
+    # broadcast's text for messages that differ per recipient.
+    (5, "Create broadcast outbox", [
+        """
+        CREATE TABLE IF NOT EXISTS Broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            Text TEXT,
+            CreatedAt TEXT,
+            CompletedAt TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS Outbox (
+            BroadcastId INTEGER NOT NULL,
+            Telegram TEXT NOT NULL,
+            Text TEXT,
+            Status TEXT NOT NULL DEFAULT 'pending',
+            Attempts INTEGER NOT NULL DEFAULT 0,
+            UpdatedAt TEXT,
+            PRIMARY KEY (BroadcastId, Telegram),
+            FOREIGN KEY (BroadcastId) REFERENCES Broadcasts(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_outbox_status ON Outbox(Status, BroadcastId)",
+    ]),
+    # SharedReflections lists every reflection whose author consented to
+    # sharing, densely numbered by Slot so a random one can be picked by
+    # probing a random Slot. Triggers keep it in sync with Reflections and
+    # with Users.ReflectionConsent.
+    (6, "Add consented reflection index for random sampling", [
+        "CREATE INDEX IF NOT EXISTS idx_reflections_telegram ON Reflections(Telegram)",
+        "CREATE INDEX IF NOT EXISTS idx_users_reflection_consent ON Users(ReflectionConsent)",
+        """
+        CREATE TABLE IF NOT EXISTS SharedReflections (
+            Slot INTEGER PRIMARY KEY,
+            ReflectionId INTEGER NOT NULL UNIQUE,
+            Telegram TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_shared_reflections_telegram ON SharedReflections(Telegram)",
+        """
+        INSERT OR IGNORE INTO SharedReflections (ReflectionId, Telegram)
+        SELECT r.id, r.Telegram
+        FROM Reflections r
+        JOIN Users u ON r.Telegram = u.Telegram
+        WHERE u.ReflectionConsent = 1
+        ORDER BY r.id
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS shared_reflections_on_insert
+        AFTER INSERT ON Reflections
+        WHEN (SELECT ReflectionConsent FROM Users WHERE Telegram = NEW.Telegram) = 1
+        BEGIN
+            INSERT OR IGNORE INTO SharedReflections (ReflectionId, Telegram) VALUES (NEW.id, NEW.Telegram);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS shared_reflections_on_delete
+        AFTER DELETE ON Reflections
+        BEGIN
+            DELETE FROM SharedReflections WHERE ReflectionId = OLD.id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS shared_reflections_on_consent
+        AFTER UPDATE OF ReflectionConsent ON Users
+        WHEN NEW.ReflectionConsent = 1 AND OLD.ReflectionConsent IS NOT 1
+        BEGIN
+            INSERT OR IGNORE INTO SharedReflections (ReflectionId, Telegram)
+            SELECT id, Telegram FROM Reflections WHERE Telegram = NEW.Telegram ORDER BY id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS shared_reflections_on_revoke
+        AFTER UPDATE OF ReflectionConsent ON Users
+        WHEN NEW.ReflectionConsent IS NOT 1 AND OLD.ReflectionConsent = 1
+        BEGIN
+            DELETE FROM SharedReflections WHERE Telegram = NEW.Telegram;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS shared_reflections_on_user_insert
+        AFTER INSERT ON Users
+        WHEN NEW.ReflectionConsent = 1
+        BEGIN
+            INSERT OR IGNORE INTO SharedReflections (ReflectionId, Telegram)
+            SELECT id, Telegram FROM Reflections WHERE Telegram = NEW.Telegram ORDER BY id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS shared_reflections_on_user_delete
+        AFTER DELETE ON Users
+        BEGIN
+            DELETE FROM SharedReflections WHERE Telegram = OLD.Telegram;
+        END
+        """,
+    ]),
+    # Append-only log of completed days, so "who completed on date X" is an
+    # index lookup. The primary key serves per-user lookups and the Date index
+    # serves per-day ones. Existing histories are dated by aligning their last
+    # completed day to lastDoneDate.
+    (7, "Create completion log", [
+        """
+        CREATE TABLE IF NOT EXISTS Completions (
+            Telegram TEXT NOT NULL,
+            Date TEXT NOT NULL,
+            PRIMARY KEY (Telegram, Date)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_completions_date ON Completions(Date, Telegram)",
+        _backfill_completions,
+        # Runs of consecutive completed days.
+        """
+        CREATE VIEW IF NOT EXISTS CompletionRuns AS
+        SELECT Telegram, MIN(Date) AS StartDate, MAX(Date) AS EndDate, COUNT(*) AS Days
+        FROM (
+            SELECT Telegram, Date,
+                   julianday(Date) - ROW_NUMBER() OVER (PARTITION BY Telegram ORDER BY Date) AS Island
+            FROM Completions
+        )
+        GROUP BY Telegram, Island
+        """,
+        # Scoring segments: completions at most one missed day apart, as a
+        # "00" ends a segment in streak_to_points. Splitting on "00" leaves an
+        # odd number of misses (3 or more) with one '0' that opens the next
+        # segment, counted in LeadingMiss.
+        """
+        CREATE VIEW IF NOT EXISTS CompletionSegments AS
+        SELECT Telegram, MIN(Date) AS StartDate, MAX(Date) AS EndDate,
+               CAST(julianday(MAX(Date)) - julianday(MIN(Date)) AS INTEGER) + 1 + MAX(LeadingMiss) AS Days
+        FROM (
+            SELECT Telegram, Date, LeadingMiss,
+                   SUM(NewSegment) OVER (PARTITION BY Telegram ORDER BY Date) AS Segment
+            FROM (
+                SELECT Telegram, Date,
+                       CASE WHEN Gap <= 2 THEN 0 ELSE 1 END AS NewSegment,
+                       CASE WHEN Gap >= 4 AND Gap % 2 = 0 THEN 1 ELSE 0 END AS LeadingMiss
+                FROM (
+                    SELECT Telegram, Date,
+                           CAST(julianday(Date) - julianday(LAG(Date) OVER (PARTITION BY Telegram ORDER BY Date)) AS INTEGER) AS Gap
+                    FROM Completions
+                )
+            )
+        )
+        GROUP BY Telegram, Segment
+        """,
+        # Approximate points: the log has no record of the days before the
+        # first completion or after the last one, which streak_to_points
+        # scores too. Users.Points remains the authoritative score.
+        """
+        CREATE VIEW IF NOT EXISTS CompletionPoints AS
+        SELECT Telegram, SUM(((Days + 1) / 2) * ((Days + 1) / 2 + 1) / 2) AS Points
+        FROM CompletionSegments
+        GROUP BY Telegram
+        """,
+    ]),
+    # lastDoneDate is compared by the reminder queries through date(TRIM(...)),
+    # which no index can serve. LastDoneDay holds the same date as a day
+    # number (see db_utils.to_day_number) and is indexed; both are written.
+    # Values that are not dates become NULL, i.e. never done.
+    (8, "Add indexed day number of the last completion", [
+        "ALTER TABLE Users ADD COLUMN LastDoneDay INTEGER",
+        "UPDATE Users SET lastDoneDate = date(TRIM(lastDoneDate)) WHERE lastDoneDate IS NOT NULL",
+        """
+        UPDATE Users
+        SET LastDoneDay = CAST(julianday(lastDoneDate) - julianday('1970-01-01') AS INTEGER)
+        WHERE lastDoneDate IS NOT NULL
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_users_last_done_day ON Users(LastDoneDay)",
+    ]),
+    # Per-user timezone and message times, as UTC minutes of the day (0-1439),
+    # so reminders go out a minute's batch at a time instead of all at once.
+    # The indexes lead with the slot and include LastDoneDay for the filter.
+    (9, "Add per-user timezone and reminder slots", [
+        f"ALTER TABLE Users ADD COLUMN TzOffsetMinutes INTEGER NOT NULL DEFAULT {DEFAULT_TZ_OFFSET_MINUTES}",
+        "ALTER TABLE Users ADD COLUMN ReminderSlot INTEGER",
+        "ALTER TABLE Users ADD COLUMN BrokenStreakSlot INTEGER",
+        _assign_reminder_slots,
+        "CREATE INDEX IF NOT EXISTS idx_users_reminder_slot ON Users(ReminderSlot, LastDoneDay)",
+        "CREATE INDEX IF NOT EXISTS idx_users_broken_streak_slot ON Users(BrokenStreakSlot, LastDoneDay)",
+    ]),
+    # Slot recipients are paged by rowid, so the slot indexes are keyed on the
+    # slot alone (SQLite appends the rowid). JobCheckpoints records how far
+    # each shard of a dispatch job has queued its recipients.
+    (10, "Add dispatch job checkpoints", [
+        "DROP INDEX IF EXISTS idx_users_reminder_slot",
+        "DROP INDEX IF EXISTS idx_users_broken_streak_slot",
+        "CREATE INDEX IF NOT EXISTS idx_users_reminder_slot ON Users(ReminderSlot)",
+        "CREATE INDEX IF NOT EXISTS idx_users_broken_streak_slot ON Users(BrokenStreakSlot)",
+        """
+        CREATE TABLE IF NOT EXISTS JobCheckpoints (
+            JobKey TEXT NOT NULL,
+            Shard INTEGER NOT NULL,
+            LastRowId INTEGER NOT NULL DEFAULT 0,
+            Done INTEGER NOT NULL DEFAULT 0,
+            UpdatedAt TEXT,
+            PRIMARY KEY (JobKey, Shard)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_job_checkpoints_done ON JobCheckpoints(Done)",
+    ]),
+    # SchedulerLease elects the one process that runs scheduled jobs.
+    # Rollovers records each closed day, so the nightly streak update is never
+    # applied twice, e.g. by a late catch-up run after a restart.
+    (11, "Add scheduler lease and rollover log", [
+        """
+        CREATE TABLE IF NOT EXISTS SchedulerLease (
+            Name TEXT PRIMARY KEY,
+            Holder TEXT NOT NULL,
+            ExpiresAt REAL NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS Rollovers (
+            Day INTEGER PRIMARY KEY,
+            RanAt TEXT
+        )
+        """,
+    ]),
+    # Persistence holds the bot framework's conversation states and user_data,
+    # one JSON row per entry. Version is bumped on every write so a process can
+    # tell when another one changed an entry; a NULL Data row is a deleted entry
+    # kept so its version keeps increasing.
+    (12, "Create conversation persistence", [
+        """
+        CREATE TABLE IF NOT EXISTS Persistence (
+            Kind TEXT NOT NULL,
+            Key TEXT NOT NULL,
+            Data TEXT,
+            Version INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (Kind, Key)
+        ) WITHOUT ROWID
+        """,
+    ]),
+    # TimePeriods mentioning the afternoon used to be read as noon.
+    (13, "Recompute reminder slots", [
+        _recompute_reminder_slots,
+    ]),
+    # Finished broadcasts are pruned by completion time.
+    (14, "Index broadcasts by completion time", [
+        "CREATE INDEX IF NOT EXISTS idx_broadcasts_completed_at ON Broadcasts(CompletedAt)",
+    ]),
+    # Counts every write that can move the leaderboard, in any process, so each
+    # process can tell when its in-memory board is out of date.
+    (15, "Add leaderboard change counter", [
+        """
+        CREATE TABLE IF NOT EXISTS Counters (
+            Name TEXT PRIMARY KEY,
+            Value INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        "INSERT OR IGNORE INTO Counters (Name, Value) VALUES ('leaderboard', 0)",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_users_leaderboard_insert AFTER INSERT ON Users
+        BEGIN
+            UPDATE Counters SET Value = Value + 1 WHERE Name = 'leaderboard';
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_users_leaderboard_update AFTER UPDATE OF Points, TelegramHandle ON Users
+        BEGIN
+            UPDATE Counters SET Value = Value + 1 WHERE Name = 'leaderboard';
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_users_leaderboard_delete AFTER DELETE ON Users
+        BEGIN
+            UPDATE Counters SET Value = Value + 1 WHERE Name = 'leaderboard';
+        END
+        """,
+    ]),
+    # The last day recorded as missed for each user, so a day closed early for
+    # one user by their next completion is not closed again by the rollover.
+    (16, "Add per-user closed day", [
+        "ALTER TABLE Users ADD COLUMN ClosedDay INTEGER",
+        _record_closed_days,
+    ]),
+]
+
+
+# Seconds to wait for another process's migration to release the write lock.
+MIGRATION_BUSY_TIMEOUT = 60
+
+
+def get_schema_version(con: sqlite3.Connection) -> int:
+    """Returns the migration version the database is currently at."""
+    return con.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(con: sqlite3.Connection) -> int:
+    """
+    Applies every pending migration in order.
+
+    Each migration runs in its own transaction together with the version bump,
+    so a failure leaves the database at the last fully applied version. The
+    transaction takes the write lock up front and re-reads the version under
+    it, so processes starting together apply each migration once: the others
+    wait for the lock and then skip what was already applied.
+
+    Returns:
+        int: The schema version after migrating.
+    """
+    current_version = get_schema_version(con)
+    for version, description, steps in MIGRATIONS:
+        if version <= current_version:
+            continue
+        cursor = con.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            current_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+            if version <= current_version:
+                con.commit()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+            # PRAGMA does not accept bound parameters; version is always an int.
+            cursor.execute(f"PRAGMA user_version = {int(version)}")
+            con.commit()
+        except Exception:
+            con.rollback()
+            logging.exception(f"❌ Migration {version} ({description}) failed")
+            raise
+        finally:
+            cursor.close()
+        current_version = version
+        logging.info(f"Applied migration {version}: {description}")
+    return current_version
+
+
+def bootstrap(database: str):
+    """
+    Prepares the database file before the connection pool opens it.
+
+    Switches the journal to WAL, which is persistent in the file, so readers no
+    longer block behind writers, then brings the schema up to date. Another
+    process may be bootstrapping the same file at once, so lock waits get
+    MIGRATION_BUSY_TIMEOUT seconds rather than failing.
+    """
+    con = sqlite3.connect(database, timeout=MIGRATION_BUSY_TIMEOUT)
+    try:
+        con.execute("PRAGMA journal_mode = WAL")
+        migrate(con)
+    finally:
+        con.close()
@@ -0,0 +1,85 @@
+import sqlite3
+import threading
+from queue import Queue
+from contextlib import contextmanager
+
+
+class ConnectionPool:
+    """
+    A bounded pool of SQLite connections.
+
+    Reads borrow one of `size` read-only connections, so several queries can
+    run in parallel from different threads. Writes go through a single writer
+    connection guarded by a lock, since SQLite only allows one writer at a
+    time anyway. Every operation gets its own cursor.
+
+    `pragmas` are applied to every connection as it is opened, since settings
+    such as synchronous and cache_size are per connection in SQLite. Likewise
+    `functions` maps SQL function names to (argument count, callable) and is
+    registered on every connection.
+    """
+
+    def __init__(self, database: str, size: int = 4, pragmas: dict = None, functions: dict = None):
+        if size < 1:
+            raise ValueError("Connection pool size must be at least 1.")
+        self.database = database
+        self.size = size
+        self.pragmas = pragmas or {}
+        self.functions = functions or {}
+        self._writer = self._connect()
+        self._write_lock = threading.Lock()
+        self._readers = Queue(maxsize=size)
+        for _ in range(size):
+            self._readers.put(self._connect(query_only=True))
+
+    def _connect(self, query_only: bool = False) -> sqlite3.Connection:
+        con = sqlite3.connect(self.database, check_same_thread=False)
+        con.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            con.execute(f"PRAGMA {name} = {value}")
+        for name, (num_args, func) in self.functions.items():
+            con.create_function(name, num_args, func, deterministic=True)
+        if query_only:
+            con.execute("PRAGMA query_only = ON")
+        return con
+
+    @contextmanager
+    def reader(self):
+        """Yields a cursor on a pooled read-only connection, blocking until one is free."""
+        con = self._readers.get()
+        cursor = con.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            self._readers.put(con)
+
+    @contextmanager
+    def writer(self):
+        """
+        Yields a cursor on the writer connection.
+
+        The block runs as one transaction: it is committed when the block exits
+        normally and rolled back if it raises. The transaction is opened with
+        BEGIN IMMEDIATE, taking the database's write lock before the block's
+        first statement, so rows it reads cannot be changed by another process
+        before it writes.
+        """
+        with self._write_lock:
+            cursor = self._writer.cursor()
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                yield cursor
+                self._writer.commit()
+            except BaseException:
+                self._writer.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def close(self):
+        """Closes every connection in the pool."""
+        with self._write_lock:
+            self._writer.close()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
@@ -0,0 +1,80 @@
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import BinaryIO, Iterator, Optional
+from .pool import ConnectionPool
+
+
+class SnapshotCache:
+    """
+    Consistent, gzip-compressed copies of the database, reused for `ttl` seconds.
+
+    A snapshot is taken with SQLite's online backup API from a pooled read
+    connection, so it reflects a single committed state even while writes are
+    in progress. It is then compressed once and every download within the TTL
+    streams the same file. Only one snapshot is built at a time.
+    """
+
+    def __init__(self, pool: ConnectionPool, ttl: float = 300, directory: Optional[str] = None):
+        self.pool = pool
+        self.ttl = ttl
+        self.directory = directory or tempfile.gettempdir()
+        self._lock = threading.Lock()
+        self._path = None
+        self._created_at = 0.0
+
+    def open(self) -> BinaryIO:
+        """
+        Opens a fresh enough compressed snapshot, building one if needed.
+
+        Blocks, so call it from a worker thread. The file is opened under the
+        lock, and a replaced snapshot is only unlinked, so a download that is
+        still streaming keeps reading the snapshot it started with.
+        """
+        with self._lock:
+            if self._path is None or time.monotonic() - self._created_at > self.ttl:
+                old_path = self._path
+                self._path = self._build()
+                self._created_at = time.monotonic()
+                if old_path is not None:
+                    os.unlink(old_path)
+            return open(self._path, "rb")
+
+    def _build(self) -> str:
+        started = time.perf_counter()
+        fd, backup_path = tempfile.mkstemp(suffix=".db", dir=self.directory)
+        os.close(fd)
+        try:
+            target = sqlite3.connect(backup_path)
+            try:
+                with self.pool.reader() as cursor:
+                    cursor.connection.backup(target)
+            finally:
+                target.close()
+            fd, path = tempfile.mkstemp(suffix=".db.gz", dir=self.directory)
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as compressed:
+                with open(backup_path, "rb") as source:
+                    shutil.copyfileobj(source, compressed, 1024 * 1024)
+        finally:
+            os.unlink(backup_path)
+        logging.info(f"📦 Database snapshot of {os.path.getsize(path)} bytes built in {time.perf_counter() - started:.2f}s")
+        return path
+
+    def close(self):
+        """Deletes the cached snapshot file."""
+        with self._lock:
+            if self._path is not None:
+                os.unlink(self._path)
+                self._path = None
+
+
+def iter_chunks(handle: BinaryIO, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Yields an open file in chunks for StreamingResponse, then closes it."""
+    with handle:
+        while chunk := handle.read(chunk_size):
+            yield chunk
@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Returned by UserCache.get when the row has to be read from the database.
+MISSING = object()
+
+
+class UserCache:
+    """
+    In-memory copy of recently used Users rows, bounded in size and age.
+
+    Database reads a user's row through it and drops the row after every
+    write to it, so repeated lookups in a command cost no query. Users that
+    are not registered are not cached, since another process may register them
+    at any time. The least recently used row is evicted once `max_size` rows
+    are held, and a row older than `ttl` seconds is read again, which bounds
+    how stale a row written by another process can get.
+
+    A row read before an invalidation is not stored after it: every
+    invalidation bumps `version`, and put() ignores rows read under an older
+    version.
+    """
+
+    def __init__(self, max_size: int = 4096, ttl: float = 30):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._rows = OrderedDict()  # telegram -> (expires_at, row)
+
+    def get(self, telegram: str):
+        """Returns the cached row, or MISSING."""
+        telegram = str(telegram)
+        with self._lock:
+            entry = self._rows.get(telegram)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return MISSING
+            self._rows.move_to_end(telegram)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, telegram: str, row: dict, version: int):
+        """Caches a row read while the cache was at `version`."""
+        telegram = str(telegram)
+        with self._lock:
+            if version != self.version:
+                return
+            self._rows[telegram] = (time.monotonic() + self.ttl, row)
+            self._rows.move_to_end(telegram)
+            if len(self._rows) > self.max_size:
+                self._rows.popitem(last=False)
+
+    def invalidate(self, telegram: str):
+        """Drops a user's row; call after the write to it is committed."""
+        with self._lock:
+            self.version += 1
+            self._rows.pop(str(telegram), None)
+
+    def clear(self):
+        """Drops every row, e.g. after a write to all users."""
+        with self._lock:
+            self.version += 1
+            self._rows.clear()
@@ -1,6 +1,6 @@
 from telegram.ext import ConversationHandler, CommandHandler, MessageHandler, ContextTypes, filters
 from telegram import ReplyKeyboardMarkup, ReplyKeyboardRemove, Update
-from .db.db import Database
+from .db.async_db import AsyncDatabase
 
 class EditHabitStates:
     START, EDIT = range(2)
@@ -23,7 +23,7 @@ async def start_edit_habit_command(update: Update, context: ContextTypes.DEFAULT
 async def edit_habit_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.message.from_user
     text = update.message.text
-    Database.get_instance().update_habit(user.id, text, None, None)
+    await AsyncDatabase.get_instance().update_habit(user.id, text, None, None)
     await update.message.reply_text(EditHabitStates.end_message)
     return ConversationHandler.END
 
@@ -35,4 +35,6 @@ edit_habit_handler = ConversationHandler(
         EditHabitStates.EDIT: [MessageHandler(filters.TEXT & ~filters.COMMAND, edit_habit_command)],
     },
     fallbacks=[],
+    name="edit_habit",
+    persistent=True,
 )
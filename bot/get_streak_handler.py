@@ -1,14 +1,16 @@
 from telegram.ext import ConversationHandler, CommandHandler, MessageHandler, ContextTypes, filters
 from telegram import Update
-from .db.db import Database
+from .db.async_db import AsyncDatabase
+from .db.db_utils import PackedStreak
 
-def format_streak(streak: str) -> str:
+def format_streak(streak: str | PackedStreak) -> str:
     """
     Removes the first element from the streak string and maps the remaining
     0s and 1s to emojis for a nicer display.
     
     Args:
-        streak (str): A string representing the user's streak, e.g. "1010110"
+        streak (str | PackedStreak): A string representing the user's streak,
+            e.g. "1010110", or its packed form.
     
     Returns:
         str: A formatted string with emojis.
@@ -17,7 +19,7 @@ def format_streak(streak: str) -> str:
         return ""
     
     # Remove the first character
-    streak = streak[1:]
+    streak = str(streak)[1:]
     
     # Define the mapping for each character
     emoji_mapping = {
@@ -33,7 +35,7 @@ def format_streak(streak: str) -> str:
 
 async def get_streak_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.message.from_user
-    streak = Database.get_instance().retrieve_streak(user.id)
+    streak = await AsyncDatabase.get_instance().retrieve_streak(user.id)
     streak = format_streak(streak)
     if streak == "" or not streak:
         streak = "You currently don't have an ongoing streak!"
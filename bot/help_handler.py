@@ -9,6 +9,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     '/get_streak - to see you habit progress \n' \
     '/edit_habit - to modify your habit \n' \
     '/leaderboard - to view the current leaderboard \n' \
+    '/rank - to see where you stand on the leaderboard \n' \
+    '/timezone - to set your timezone for reminders, e.g. /timezone +8 \n' \
     ''
     await update.message.reply_text(help_message)
     return ConversationHandler.END
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+
+def get_update_chat_id(update: dict) -> Optional[int]:
+    """
+    Finds the chat (or user) an update belongs to in the raw webhook JSON,
+    without building an Update object.
+    """
+    for key, value in update.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        if "chat" in value:
+            return value["chat"].get("id")
+        if isinstance(value.get("message"), dict) and "chat" in value["message"]:
+            return value["message"]["chat"].get("id")
+        if "from" in value:
+            return value["from"].get("id")
+        if "user" in value:
+            return value["user"].get("id")
+    return None
+
+
+class RecentUpdateIds:
+    """
+    Remembers the last `size` update IDs, to drop repeated deliveries.
+
+    A ring buffer gives the eviction order and a set gives O(1) lookups.
+    """
+
+    def __init__(self, size: int = 10000):
+        self._order = deque()
+        self._ids = set()
+        self.size = size
+
+    def __contains__(self, update_id) -> bool:
+        return update_id in self._ids
+
+    def add(self, update_id):
+        if update_id in self._ids:
+            return
+        if len(self._order) >= self.size:
+            self._ids.discard(self._order.popleft())
+        self._order.append(update_id)
+        self._ids.add(update_id)
+
+
+class UpdateIngestor:
+    """
+    Bounded queue of incoming webhook updates with a fixed pool of workers.
+
+    Updates are sharded by chat, one queue and one worker per shard, so
+    updates from the same chat are handled in order while different chats are
+    handled in parallel. When a shard's queue is full the update is rejected
+    instead of buffered, and the webhook answers 503 so Telegram retries it
+    later; memory therefore stays bounded during bursts. Updates whose
+    update_id was accepted recently are Telegram retries and are dropped.
+    """
+
+    def __init__(self, process: Callable[[dict], Awaitable], workers: int = 8, queue_size: int = 1000,
+                 dedup_size: int = 10000):
+        self.process = process
+        self.workers = workers
+        self._queues = [asyncio.Queue(maxsize=max(1, queue_size // workers)) for _ in range(workers)]
+        self._tasks = []
+        self._recent = RecentUpdateIds(dedup_size)
+        self.accepted = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+
+    def start(self):
+        """Starts one worker task per shard."""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(queue)) for queue in self._queues]
+
+    async def stop(self, timeout: float = 10):
+        """Waits up to `timeout` seconds for queued updates, then stops the workers."""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues)), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"⚠️ Stopping with {self.depth()} update(s) still queued")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, update: dict) -> bool:
+        """
+        Queues an update for processing.
+
+        Returns:
+            bool: False if the update was rejected because its shard is full.
+                Duplicates are dropped but count as delivered.
+        """
+        update_id = update.get("update_id")
+        if update_id is not None and update_id in self._recent:
+            self.duplicates += 1
+            return True
+        key = get_update_chat_id(update)
+        if key is None:
+            key = update.get("update_id", 0)
+        try:
+            self._queues[hash(key) % self.workers].put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        # Only remember accepted updates, so a rejected one is processed when Telegram retries it.
+        if update_id is not None:
+            self._recent.add(update_id)
+        self.accepted += 1
+        return True
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            update = await queue.get()
+            try:
+                await self.process(update)
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                logging.exception("❌ Failed to process update")
+            finally:
+                queue.task_done()
+
+    def depth(self) -> int:
+        """Number of updates waiting across all shards."""
+        return sum(queue.qsize() for queue in self._queues)
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": self.depth(),
+            "queue_capacity": sum(queue.maxsize for queue in self._queues),
+            "max_shard_depth": max(queue.qsize() for queue in self._queues),
+            "workers": self.workers,
+            "accepted": self.accepted,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
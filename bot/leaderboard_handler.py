@@ -1,13 +1,16 @@
 from telegram.ext import ConversationHandler, CommandHandler, MessageHandler, ContextTypes, filters
 from telegram import ReplyKeyboardMarkup, ReplyKeyboardRemove, Update
-from .db.db import Database
+from .db.async_db import AsyncDatabase
+
+# Last rendered leaderboard, reused until the top entries change.
+_rendered_leaderboard = {"version": None, "message": None}
 
 def format_leaderboard_message(leaderboard_entries):
     """
     Formats leaderboard entries into a message string suitable for Telegram.
     
     Args:
-        leaderboard_entries: A list of sqlite3.Row objects with 'Telegram' and 'Points'.
+        leaderboard_entries: A list of entries with 'TelegramHandle' and 'Points'.
     
     Returns:
         A string representing the formatted leaderboard message.
@@ -16,7 +19,7 @@ def format_leaderboard_message(leaderboard_entries):
         return "No leaderboard entries available."
 
     # Start with a header.
-    message = "🏆 Leaderboard 🏆\n\n"
+    lines = ["🏆 Leaderboard 🏆\n\n"]
     
     current_rank = 0
     previous_points = None
@@ -29,14 +32,20 @@ def format_leaderboard_message(leaderboard_entries):
         if points != previous_points:
             current_rank = index  # Update rank only if points are different
 
-        message += f"{current_rank}. @{telegram} - {points} point(s)\n"
+        lines.append(f"{current_rank}. @{telegram} - {points} point(s)\n")
         previous_points = points  # Update the last seen points
 
-    return message
+    return "".join(lines)
 
 async def leaderboard_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    leaderboard = Database.get_instance().get_leaderboard()
-    await update.message.reply_text(format_leaderboard_message(leaderboard))
+    db = AsyncDatabase.get_instance()
+    await db.refresh_leaderboard()  # Picks up points changed by other processes
+    version = db.leaderboard_version
+    if _rendered_leaderboard["version"] != version:
+        leaderboard = await db.get_leaderboard()
+        _rendered_leaderboard["version"] = version
+        _rendered_leaderboard["message"] = format_leaderboard_message(leaderboard)
+    await update.message.reply_text(_rendered_leaderboard["message"])
     return ConversationHandler.END
 
 
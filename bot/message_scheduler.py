@@ -1,20 +1,72 @@
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 import asyncio
 import logging
-from .db.db import Database
+import os
+import random
+import socket
+import uuid
+from .config import Config
+from .db.async_db import AsyncDatabase
+from .db.db_utils import MINUTES_PER_DAY, local_hour, to_day_number
 from datetime import timezone, timezone, datetime, timedelta
 
+broken_streak_message = (
+    "YOU BROKE YOUR STREAK?? 😱😱😱 NOOOOOOOOO 💔😭😭😭😭.....\n\n"
+    "Restart today and keep building that habit. Remember, you can always adjust your habit to make it easier so that you don't miss twice! \n\n"
+    "You've got this 👍🏻❤️"
+)
+
+def reminder_message(hour: int) -> str:
+    """Returns the reminder, greeting the user for their local hour."""
+    if 5 <= hour < 12:
+        return "Good Morning! Here's a friendly reminder to do your habit for today :)"
+    if 12 <= hour < 17:
+        return "Good Afternoon! We hope your day is going great :) Here's a friendly reminder to do your habit for today!"
+    return "Good Evening! We hope your day has been great" \
+    ":) Here's a friendly reminder to do your habit for today!"
+
+# Jobs are stored in a database, so they must reference module-level functions
+# rather than bound methods of the scheduler.
+async def run_slot_dispatch():
+    await MessageScheduler.get_instance().scheduled_slot_dispatch()
+
+async def run_update_streaks():
+    await MessageScheduler.get_instance().scheduled_update_streaks()
+
+async def run_reflection_sending():
+    await MessageScheduler.get_instance().scheduled_reflection_sending()
+
+SCHEDULER_LEASE = "message_scheduler"
+# Counters row holding the last minute (days since DAY_EPOCH * MINUTES_PER_DAY + UTC minute) dispatched.
+LAST_DISPATCH_COUNTER = "slot_dispatch"
+
 class MessageScheduler:
+    """
+    Runs the scheduled jobs in at most one process.
+
+    Jobs live in a persistent job store, so a run missed while the process
+    was down is run once (coalesced) on startup if it is still within its
+    misfire grace time. Every process competes for a lease in the database
+    and only the holder starts the APScheduler; if it stops renewing the
+    lease another process takes over, so web workers can be scaled without
+    running jobs twice.
+    """
     _instance = None  # Class variable to store the singleton instance
 
     def __init__(self):
         """Private constructor to prevent direct instantiation."""
         if MessageScheduler._instance is not None:
             raise Exception("This class is a singleton! Use get_instance() instead.")
-        self.scheduler = AsyncIOScheduler(timezone=timezone.utc)
-        self._add_jobs()
+        self.scheduler = AsyncIOScheduler(
+            jobstores={"default": SQLAlchemyJobStore(url=Config.SCHEDULER_DB_URL)},
+            job_defaults={"coalesce": True, "max_instances": 1},
+            timezone=timezone.utc,
+        )
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lease_task = None
 
     @classmethod
     def get_instance(cls):
@@ -24,78 +76,173 @@ class MessageScheduler:
             cls._instance.start_scheduler()
         return cls._instance
     
-    async def scheduled_reminder_messages(self):
-        from .bot import TelegramBot
-        message = "Good Evening! We hope your day has been great" \
-        ":) Here's a friendly reminder to do your habit for today!"
-        bot = await TelegramBot.get_instance()
-        await bot.broadcast_message(message, Database.get_instance().get_users_streaks_breaking())
+    async def scheduled_slot_dispatch(self):
+        """
+        Sends the reminders and broken streak messages due this minute.
+
+        Every user has a UTC minute of the day for each message, so the load
+        is spread over the day. The last minute dispatched is stored in the
+        database once its jobs finish, so minutes missed while a previous run
+        was still sending, during a restart or while the lease moved are
+        caught up on, up to Config.DISPATCH_CATCH_UP_MINUTES back. A minute
+        whose jobs were interrupted is dispatched again and resumes from its
+        checkpoints.
+        """
+        db = AsyncDatabase.get_instance()
+        now = datetime.now(timezone.utc)
+        now_minute = to_day_number(now.date()) * MINUTES_PER_DAY + now.hour * 60 + now.minute
+        last_minute = await db.get_counter(LAST_DISPATCH_COUNTER)
+        if last_minute is None:
+            last_minute = now_minute - 1
+        if last_minute >= now_minute:
+            return
+        first_minute = max(last_minute + 1, now_minute - Config.DISPATCH_CATCH_UP_MINUTES + 1)
+        if first_minute > last_minute + 1:
+            logging.warning(f"⚠️ Skipping {first_minute - last_minute - 1} reminder minute(s) older than the catch-up window")
+        await asyncio.gather(*(
+            self._run_slot_job(kind, minute // MINUTES_PER_DAY, minute % MINUTES_PER_DAY)
+            for minute in range(first_minute, now_minute + 1)
+            for kind in ("reminder", "broken")
+        ))
+        await db.set_counter(LAST_DISPATCH_COUNTER, now_minute)
+
+    async def _run_slot_job(self, kind: str, day: int, slot: int):
+        """
+        Queues one kind of message for every user due in a slot.
 
-    async def scheduled_broken_streak_messages(self):
+        The users are split into Config.DISPATCH_SHARDS shards by rowid. Each
+        shard with users to message starts after a random delay of up to
+        Config.DISPATCH_JITTER_SECONDS and reads its users a page at a time, so neither memory nor the send
+        rate depends on how many users share the slot. The page's messages and
+        the shard's checkpoint are saved in one transaction, so a job resumed
+        after a restart continues where it stopped.
+        """
+        db = AsyncDatabase.get_instance()
+        fetch_page = db.get_users_reminder_due if kind == "reminder" else db.get_users_broken_due
+        if not await fetch_page(slot, limit=1):
+            return  # Most minutes have nobody due; skip the checkpoints.
+        job_key = f"{kind}:{day}:{slot}"
+        checkpoints = await db.start_job(job_key, Config.DISPATCH_SHARDS)
+        await asyncio.gather(*(
+            self._run_shard(job_key, kind, slot, shard, len(checkpoints), last_rowid)
+            for shard, (last_rowid, done) in checkpoints.items()
+            if not done
+        ))
+
+    async def _run_shard(self, job_key: str, kind: str, slot: int, shard: int, shards: int, last_rowid: int):
         from .bot import TelegramBot
-        broken_streak_message = (
-            "YOU BROKE YOUR STREAK?? 😱😱😱 NOOOOOOOOO 💔😭😭😭😭.....\n\n"
-            "Restart today and keep building that habit. Remember, you can always adjust your habit to make it easier so that you don't miss twice! \n\n"
-            "You've got this 👍🏻❤️"
-        )
+        db = AsyncDatabase.get_instance()
         bot = await TelegramBot.get_instance()
-        await bot.broadcast_message(broken_streak_message, Database.get_instance().get_users_streaks_broken())
+        fetch_page = db.get_users_reminder_due if kind == "reminder" else db.get_users_broken_due
+        page = await fetch_page(slot, shard, shards, last_rowid, Config.DISPATCH_PAGE_SIZE)
+        if page:
+            await asyncio.sleep(random.uniform(0, Config.DISPATCH_JITTER_SECONDS))
+        while page:
+            last_rowid = page[-1][0]
+            if kind == "reminder":
+                messages = [(user, reminder_message(local_hour(slot, tz_offset))) for _, user, tz_offset in page]
+            else:
+                messages = [(user, broken_streak_message) for _, user, _ in page]
+            logging.info(f"Sending {len(messages)} {kind} message(s) for slot {slot // 60:02d}:{slot % 60:02d} UTC, shard {shard}")
+            await bot.broadcast_messages(messages, checkpoint=(job_key, shard, last_rowid))
+            page = await fetch_page(slot, shard, shards, last_rowid, Config.DISPATCH_PAGE_SIZE)
+        await db.complete_job_shard(job_key, shard)
 
     async def scheduled_reflection_sending(self):
         from .bot import TelegramBot
         bot = await TelegramBot.get_instance()
-        db = Database.get_instance()
-        user_ids = db.get_all_users()
-        for user in user_ids:
-            # Retrieve a random reflection from other users that have given consent.
-            reflection = db.retrieve_random_reflection(user)
-            if reflection:
-                logging.info(f"Sending reflection to user {user} ")
-                reflection = "This is a randomised reflection from another participant!\n\n" + reflection
-                await bot.send_message(user, reflection)
-            else:
-                logging.info(f"No available reflection for user {user}.")
-            await asyncio.sleep(0.1)
+        db = AsyncDatabase.get_instance()
+        user_ids = await db.get_all_users()
+        # Assign a random reflection from other users that have given consent to everyone at once.
+        reflections = await db.retrieve_random_reflections(user_ids)
+        logging.info(f"Sending reflections to {len(reflections)} of {len(user_ids)} users")
+        await bot.broadcast_messages(
+            (user, "This is a randomised reflection from another participant!\n\n" + reflection)
+            for user, reflection in reflections.items()
+        )
 
     async def scheduled_update_streaks(self):
-        db = Database.get_instance().update_all_streaks()
-        logging.info("Updated all streaks!")
+        updated, elapsed = await AsyncDatabase.get_instance().update_all_streaks()
+        logging.info(f"Updated all streaks! ({updated} users in {elapsed:.3f}s)")
+
+    def _add_job(self, func, job_id: str, trigger, misfire_grace_time: int):
+        """
+        Adds a job unless the job store already has it.
+
+        A stored job keeps its next run time, so a run missed during a restart
+        is still caught up; it is only rescheduled if its trigger changed.
+        """
+        job = self.scheduler.get_job(job_id)
+        if job is None:
+            self.scheduler.add_job(func, trigger=trigger, id=job_id, misfire_grace_time=misfire_grace_time)
+        elif str(job.trigger) != str(trigger):
+            self.scheduler.reschedule_job(job_id, trigger=trigger)
 
     def _add_jobs(self):
         """Add scheduled jobs for reminders and streak messages."""
-        # Reminder Messages - Every day at 5 PM UTC+5
-        self.scheduler.add_job(
-            self.scheduled_reminder_messages,
-            trigger=CronTrigger(hour=12, minute=0, timezone=timezone.utc)
-        )
-
-        # Broken Streak Messages - Every day at 5 AM UTC+5 (i.e. 00:00 UTC)
-        self.scheduler.add_job(
-            self.scheduled_broken_streak_messages,
-            trigger=CronTrigger(hour=0, minute=0, timezone=timezone.utc)
+        # Reminder and Broken Streak Messages - each user at their own time (see Users.ReminderSlot)
+        self._add_job(
+            run_slot_dispatch, "slot_dispatch",
+            trigger=CronTrigger(minute="*", timezone=timezone.utc),
+            misfire_grace_time=60,
         )
 
-        self.scheduler.add_job(
-            self.scheduled_update_streaks,
-            trigger=CronTrigger(hour=19, minute=0, timezone=timezone.utc)
+        # Streak rollover - Every day at midnight UTC+5 (i.e. 19:00 UTC), for everyone.
+        # Skipping it would corrupt every streak, so it is caught up for most of the day.
+        self._add_job(
+            run_update_streaks, "update_streaks",
+            trigger=CronTrigger(hour=19, minute=0, timezone=timezone.utc),
+            misfire_grace_time=12 * 60 * 60,
         )
 
         # Reflection Messages - Every day at 9 PM UTC+5 (i.e. 16:00 UTC)
         reflection_starttime = datetime.strptime("2024-03-23 00:00:00", "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
         reflection_stoptime = reflection_starttime + timedelta(days=22)
-        self.scheduler.add_job(
-            self.scheduled_reflection_sending,
+        self._add_job(
+            run_reflection_sending, "reflection_sending",
             trigger=IntervalTrigger(days=3,
                                     start_date=reflection_starttime,
-                                    end_date=reflection_stoptime)
+                                    end_date=reflection_stoptime),
+            misfire_grace_time=60 * 60,
         )
 
+    async def _keep_lease(self):
+        """Renews the scheduler lease, starting or stopping the jobs as it is won or lost."""
+        db = AsyncDatabase.get_instance()
+        while True:
+            try:
+                leader = await db.acquire_lease(SCHEDULER_LEASE, self.holder, Config.SCHEDULER_LEASE_TTL)
+            except Exception:
+                logging.exception("❌ Failed to renew the scheduler lease")
+                leader = False
+            if leader and not self.scheduler.running:
+                # Start paused so stored jobs are checked before any missed run fires.
+                self.scheduler.start(paused=True)
+                self._add_jobs()
+                self.scheduler.resume()
+                logging.info(f"Message Scheduler is running! (lease held by {self.holder})")
+            elif not leader and self.scheduler.running:
+                self.scheduler.shutdown(wait=False)
+                logging.warning("⚠️ Lost the scheduler lease, Message Scheduler stopped")
+            await asyncio.sleep(Config.SCHEDULER_LEASE_TTL / 3)
+
+    @property
+    def holds_lease(self) -> bool:
+        """Whether this process holds the scheduler lease and is running the jobs."""
+        return self.scheduler.running
+
     def start_scheduler(self):
-        """Starts the scheduler."""
-        self.scheduler.start()
-        logging.info("Message Scheduler is running!")
+        """Starts competing for the scheduler lease; the jobs run while it is held."""
+        if self._lease_task is None:
+            self._lease_task = asyncio.create_task(self._keep_lease())
 
-    def stop_scheduler(self):
-        """Stops the scheduler."""
-        self.scheduler.shutdown()
+    async def stop_scheduler(self):
+        """Stops the scheduler and hands the lease over."""
+        if self._lease_task is not None:
+            self._lease_task.cancel()
+            await asyncio.gather(self._lease_task, return_exceptions=True)
+            self._lease_task = None
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+        await AsyncDatabase.get_instance().release_lease(SCHEDULER_LEASE, self.holder)
         logging.info("Message Scheduler stopped!")
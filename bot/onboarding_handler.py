@@ -1,6 +1,6 @@
 from telegram.ext import ConversationHandler, CommandHandler, MessageHandler, ContextTypes, filters
 from telegram import ReplyKeyboardMarkup, ReplyKeyboardRemove, Update
-from .db.db import Database
+from .db.async_db import AsyncDatabase
 from datetime import datetime, timezone, timedelta
 import logging
 
@@ -24,7 +24,7 @@ class OnboardingStates:
     invalid_consent_message = "Sorry, we didn't quite get that, could you please try clicking the buttons again?"
 
 
-def call_onboard_function(user_data: dict):
+async def call_onboard_function(user_data: dict):
     now_utc5 = datetime.now(timezone(timedelta(hours=5)))
     # Subtract one day to get yesterday
     yesterday = now_utc5 - timedelta(days=1)
@@ -34,9 +34,9 @@ def call_onboard_function(user_data: dict):
     last_done_date_str = last_done_date.strftime("%Y-%m-%d")
     streak = "0"
     initial_points = 0
-    Database.get_instance().add_new_user(
-        (user_data["telegram"].id,
-         user_data["telegram"].username,
+    await AsyncDatabase.get_instance().add_new_user(
+        (user_data["telegram_id"],
+         user_data["telegram_username"],
          user_data["habit"],
          user_data["location"],
          user_data["time_period"],
@@ -52,8 +52,10 @@ def call_onboard_function(user_data: dict):
 async def onboard_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.message.from_user
     text = update.message.text
-    context.user_data["telegram"] = user
-    if Database.get_instance().is_user_registered(user.id):
+    # Only plain values, since user_data is persisted as JSON
+    context.user_data["telegram_id"] = user.id
+    context.user_data["telegram_username"] = user.username
+    if await AsyncDatabase.get_instance().is_user_registered(user.id):
         await update.message.reply_text(OnboardingStates.already_onboarded_message)
         return ConversationHandler.END
     next_state = OnboardingStates.WHAT
@@ -137,7 +139,8 @@ async def consent_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data["reflection_consent"] = 1
     else:
         context.user_data["reflection_consent"] = 0
-    call_onboard_function(context.user_data)
+    await call_onboard_function(context.user_data)
+    context.user_data.clear()  # Saved to Users, so nothing is left to persist
     await update.message.reply_text(OnboardingStates.end_message)
     return ConversationHandler.END
 
@@ -151,4 +154,6 @@ onboarding_handler = ConversationHandler(
         OnboardingStates.CONSENT: [MessageHandler(filters.TEXT & ~filters.COMMAND, consent_command)],
     },
     fallbacks=[],
+    name="onboarding",
+    persistent=True,
 )
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+from typing import Callable
+from .broadcaster import Broadcaster
+from .db.async_db import AsyncDatabase
+
+
+class OutboxWorker:
+    """
+    Delivers queued Outbox rows through the Broadcaster.
+
+    Rows are claimed in batches, sent, and their outcome written back in one
+    transaction per batch, so a restart resumes from the first unsent batch
+    instead of losing the rest of the broadcast. Batches are kept small because
+    a crash mid-batch leaves its rows to be sent again on resume. Only one
+    drain runs at a time per process; a drain requested while one is running
+    is picked up by it. Drains run in a background task, so queueing a
+    broadcast never waits for it to be sent.
+
+    With `deliver` False, enqueue only writes the outbox and returns, leaving
+    delivery to a worker process that polls it. Only one process delivers at
+    a time: while `is_leader` returns False, drain leaves the outbox to the
+    process for which it returns True. Rows still marked as sending
+    `send_timeout` seconds after being claimed were left by a process that
+    stopped mid-send, and are sent again.
+    """
+
+    def __init__(self, broadcaster: Broadcaster, batch_size: int = 32, deliver: bool = True,
+                 is_leader: Callable[[], bool] = lambda: True, send_timeout: float = 300):
+        self.broadcaster = broadcaster
+        self.batch_size = batch_size
+        self.deliver = deliver
+        self.is_leader = is_leader
+        self.send_timeout = send_timeout
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._poll_task = None
+        self._drain_requested = False
+        self._reports = []  # Broadcast IDs to log once delivered
+
+    async def resume(self):
+        """Starts draining rows left by the last shutdown in the background."""
+        self._request_drain()
+
+    def _request_drain(self):
+        """Drains the outbox in the background task, starting it if it is not running."""
+        self._drain_requested = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._drain_in_background())
+
+    async def _drain_in_background(self):
+        db = AsyncDatabase.get_instance()
+        while self._drain_requested:
+            self._drain_requested = False
+            try:
+                delivered = await self.drain()
+            except Exception:
+                logging.exception("❌ Failed to drain the outbox")
+                continue
+            reports, self._reports = self._reports, []
+            for broadcast_id in reports:
+                if not delivered:
+                    logging.info(f"📬 Broadcast {broadcast_id} queued for the delivering process")
+                    continue
+                status = await db.get_broadcast_status(broadcast_id)
+                logging.info(f"✅ Broadcast {broadcast_id} completed: {status.get('sent', 0)} sent, {status.get('failed', 0)} failed.")
+
+    def start_polling(self, interval: float):
+        """Drains the outbox every `interval` seconds in the background."""
+        if self._poll_task is None:
+            self._poll_task = asyncio.create_task(self._poll(interval))
+
+    async def _poll(self, interval: float):
+        while True:
+            try:
+                await self.drain()
+            except Exception:
+                logging.exception("❌ Failed to drain the outbox")
+            await asyncio.sleep(interval)
+
+    async def stop(self):
+        """Stops background draining; unsent rows are resumed by the next worker."""
+        tasks = [task for task in (self._task, self._poll_task) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = self._poll_task = None
+
+    async def drain(self) -> bool:
+        """
+        Sends every pending Outbox row, returning once none are left.
+
+        Returns:
+            bool: False if the outbox was left to another process.
+        """
+        db = AsyncDatabase.get_instance()
+        async with self._lock:
+            if not self.deliver or not self.is_leader():
+                return False
+            requeued = await db.requeue_inflight_outbox(self.send_timeout)
+            if requeued:
+                logging.info(f"Requeued {requeued} interrupted outbox message(s)")
+            while True:
+                batch = await db.claim_outbox_batch(self.batch_size)
+                if not batch:
+                    return True
+                results = []
+                await self.broadcaster.broadcast(
+                    ((telegram, text, broadcast_id) for broadcast_id, telegram, text in batch),
+                    on_result=lambda item, sent: results.append((item[2], item[0], sent)),
+                )
+                await db.complete_outbox_batch(results)
+
+    async def enqueue(self, text, recipients, checkpoint=None) -> int:
+        """
+        Queues a broadcast and starts delivering it in the background.
+
+        Returns as soon as the broadcast is queued, so a long broadcast does
+        not hold up the update that started it. If this process does not
+        deliver, the process that does picks it up instead.
+        `checkpoint` is passed to Database.create_broadcast.
+
+        Returns:
+            int: The broadcast's ID.
+        """
+        db = AsyncDatabase.get_instance()
+        broadcast_id = await db.create_broadcast(text, recipients, checkpoint)
+        if not self.deliver or not self.is_leader():
+            logging.info(f"📬 Broadcast {broadcast_id} queued for the delivering process")
+            return broadcast_id
+        self._reports.append(broadcast_id)
+        self._request_drain()
+        return broadcast_id
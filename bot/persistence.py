@@ -0,0 +1,162 @@
+import asyncio
+import logging
+from typing import Dict, MutableMapping, Optional, Tuple
+import orjson
+from telegram.ext import BasePersistence, PersistenceInput
+from .db.async_db import AsyncDatabase
+
+USER_DATA = "user_data"
+
+
+def _conversation_kind(name: str) -> str:
+    return f"conversation:{name}"
+
+
+class SQLitePersistence(BasePersistence):
+    """
+    Keeps conversation states and user_data in the bot's database.
+
+    Updates from the application only mark entries dirty; flush() writes all
+    dirty entries in one transaction, so a burst of messages costs one write
+    per interval instead of one per message. An entry whose JSON did not
+    change is not marked at all. Entries are stored as JSON, so user_data may
+    only hold JSON-serializable values.
+
+    Every stored entry has a version, bumped on each write.
+    refresh_user_data, called before each update is handled, reloads a user's
+    data when its version shows another process changed it.
+    refresh_conversations does the same for the conversation states of the
+    update's chat; the framework has no hook for it, so TelegramBot calls it.
+    Either way a change is only seen by other processes once it is flushed,
+    so an update that reaches another process within the flush interval can
+    still find the old state.
+    """
+
+    def __init__(self, update_interval: float = 5):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, callback_data=False),
+            update_interval=update_interval,
+        )
+        self._dirty: Dict[Tuple[str, str], Optional[str]] = {}  # (kind, key) -> JSON, or None to delete
+        self._stored: Dict[Tuple[str, str], Optional[str]] = {}  # JSON as last loaded or marked
+        self._versions: Dict[Tuple[str, str], int] = {}
+        self._flush_lock = asyncio.Lock()
+
+    async def _load(self, kind: str) -> Dict[str, str]:
+        entries = await AsyncDatabase.get_instance().get_persisted_data(kind)
+        for key, (version, data) in entries.items():
+            self._versions[(kind, key)] = version
+            self._stored[(kind, key)] = data
+        return {key: data for key, (_, data) in entries.items()}
+
+    def _mark(self, kind: str, key: str, data: Optional[str]):
+        if self._stored.get((kind, key)) == data:
+            return
+        self._stored[(kind, key)] = data
+        self._dirty[(kind, key)] = data
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        return {int(key): orjson.loads(data) for key, data in (await self._load(USER_DATA)).items()}
+
+    async def get_conversations(self, name: str) -> Dict[tuple, object]:
+        entries = await self._load(_conversation_kind(name))
+        return {tuple(orjson.loads(key)): orjson.loads(state) for key, state in entries.items()}
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        # Empty user_data is deleted rather than stored, so only users with data have rows.
+        self._mark(USER_DATA, str(user_id), orjson.dumps(data).decode() if data else None)
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        state = None if new_state is None else orjson.dumps(new_state).decode()
+        self._mark(_conversation_kind(name), orjson.dumps(list(key)).decode(), state)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._mark(USER_DATA, str(user_id), None)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        entry = (USER_DATA, str(user_id))
+        if entry in self._dirty:
+            return  # Local changes are newer than anything stored
+        stored = await AsyncDatabase.get_instance().get_persisted_entry(*entry)
+        version, data = stored if stored else (None, None)
+        if version == self._versions.get(entry):
+            return
+        user_data.clear()
+        if data:
+            user_data.update(orjson.loads(data))
+        self._versions[entry] = version
+        self._stored[entry] = data
+
+    async def refresh_conversations(self, conversations: Dict[str, Tuple[tuple, MutableMapping]]) -> None:
+        """
+        Reloads conversation states that another process changed, in one query.
+
+        Args:
+            conversations: Maps each conversation's name to the update's key in
+                it and the handler's mapping of keys to states, which is
+                updated in place.
+        """
+        entries = {
+            (_conversation_kind(name), orjson.dumps(list(key)).decode()): (key, states)
+            for name, (key, states) in conversations.items()
+        }
+        to_check = [entry for entry in entries if entry not in self._dirty]  # Local changes are newer
+        stored = await AsyncDatabase.get_instance().get_persisted_entries(to_check)
+        for entry in to_check:
+            version, data = stored.get(entry, (None, None))
+            if version == self._versions.get(entry):
+                continue
+            key, states = entries[entry]
+            if data is None:
+                states.pop(key, None)
+            else:
+                states[key] = orjson.loads(data)
+            self._versions[entry] = version
+            self._stored[entry] = data
+
+    async def flush(self) -> None:
+        """Writes every dirty entry in one transaction."""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, {}
+            try:
+                versions = await AsyncDatabase.get_instance().save_persisted_data(
+                    [(kind, key, data) for (kind, key), data in dirty.items()]
+                )
+            except Exception:
+                # Retry on the next flush, unless the entry changed again meanwhile.
+                for entry, data in dirty.items():
+                    self._dirty.setdefault(entry, data)
+                raise
+            self._versions.update(versions)
+            logging.debug(f"💾 Flushed {len(dirty)} persisted entries")
+
+    # Chat data, bot data and callback data are not stored (see store_data).
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> Optional[tuple]:
+        return None
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data: tuple) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
@@ -0,0 +1,44 @@
+from telegram.ext import ConversationHandler, CommandHandler, ContextTypes
+from telegram import Update
+from .db.async_db import AsyncDatabase
+
+not_registered_message = "You haven't onboarded yet! Use the /onboard command to join the leaderboard."
+
+def format_rank_message(standing: dict) -> str:
+    """
+    Formats a user's standing into a message string suitable for Telegram.
+
+    Args:
+        standing: The dict returned by Database.get_standing.
+
+    Returns:
+        A string with the user's rank, percentile and nearby users.
+    """
+    lines = [
+        "📊 Your Standing 📊\n\n",
+        f"You are ranked {standing['rank']} out of {standing['total']}, "
+        f"ahead of {standing['percentile']:.0f}% of participants!\n\n",
+    ]
+    for entry in standing["above"] + [None] + standing["below"]:
+        if entry is None:
+            lines.append(f"{standing['rank']}. You - {standing['points']} point(s) ⬅️\n")
+        else:
+            lines.append(f"{entry['Rank']}. @{entry['TelegramHandle']} - {entry['Points']} point(s)\n")
+    return "".join(lines)
+
+async def rank_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.message.from_user
+    standing = await AsyncDatabase.get_instance().get_standing(user.id)
+    if standing is None:
+        await update.message.reply_text(not_registered_message)
+    else:
+        await update.message.reply_text(format_rank_message(standing))
+    return ConversationHandler.END
+
+
+
+rank_handler = ConversationHandler(
+    entry_points=[CommandHandler("rank", rank_command)],
+    states={},
+    fallbacks=[],
+)
@@ -1,6 +1,6 @@
 from telegram.ext import ConversationHandler, CommandHandler, MessageHandler, ContextTypes, filters
 from telegram import ReplyKeyboardMarkup, ReplyKeyboardRemove, Update
-from .db.db import Database
+from .db.async_db import AsyncDatabase
 
 class AddReflectionStates:
     START, ADD = range(2)
@@ -23,7 +23,7 @@ async def start_add_reflection_command(update: Update, context: ContextTypes.DEF
 async def add_reflection_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.message.from_user
     text = update.message.text
-    Database.get_instance().update_reflection(user.id, text)
+    await AsyncDatabase.get_instance().update_reflection(user.id, text)
     await update.message.reply_text(AddReflectionStates.end_message)
     return ConversationHandler.END
 
@@ -33,4 +33,6 @@ add_reflection_handler = ConversationHandler(
         AddReflectionStates.ADD: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_reflection_command)],
     },
     fallbacks=[],
+    name="add_reflection",
+    persistent=True,
 )
@@ -9,8 +9,10 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/complete - Log your habit completion for the day\n"
         "/get_streak - View your habit progress\n"
         "/leaderboard - View the current leaderboard\n"
+        "/rank - View your rank and the participants around you\n"
         "/add_reflection - Insert your reflection entry. You will be prompted to reflect on Days 5, 8, 11.\n"
         "/edit_habit - Modify your habit\n"
+        "/timezone - Set your timezone so reminders arrive at your local time (e.g. /timezone +8)\n"
         "/help - View all available functions"
     )
     await update.message.reply_text(start_message)
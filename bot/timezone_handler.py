@@ -0,0 +1,53 @@
+import re
+from typing import Optional
+from telegram.ext import ConversationHandler, CommandHandler, ContextTypes
+from telegram import Update
+from .db.async_db import AsyncDatabase
+
+usage_message = "Tell us your timezone as an offset from UTC, e.g. /timezone +8 or /timezone -3:30"
+not_registered_message = "You haven't onboarded yet! Use the /onboard command first."
+
+_OFFSET_PATTERN = re.compile(r"^(?:utc|gmt)?\s*([+-]?)(\d{1,2})(?::?(\d{2}))?$", re.IGNORECASE)
+
+def parse_utc_offset(text: str) -> Optional[int]:
+    """
+    Parses a UTC offset such as "+8", "-3:30" or "UTC+05:45".
+
+    Returns:
+        The offset in minutes, or None if the text is not a valid offset.
+    """
+    match = _OFFSET_PATTERN.match(text.strip())
+    if not match:
+        return None
+    hours, minutes = int(match[2]), int(match[3] or 0)
+    if minutes >= 60:
+        return None
+    offset = hours * 60 + minutes
+    if match[1] == "-":
+        offset = -offset
+    if not -12 * 60 <= offset <= 14 * 60:
+        return None
+    return offset
+
+async def timezone_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.message.from_user
+    offset = parse_utc_offset(" ".join(context.args)) if context.args else None
+    if offset is None:
+        await update.message.reply_text(usage_message)
+        return ConversationHandler.END
+    if not await AsyncDatabase.get_instance().update_timezone(user.id, offset):
+        await update.message.reply_text(not_registered_message)
+        return ConversationHandler.END
+    sign = "+" if offset >= 0 else "-"
+    await update.message.reply_text(
+        f"Got it! Your reminders will now follow UTC{sign}{abs(offset) // 60:02d}:{abs(offset) % 60:02d}."
+    )
+    return ConversationHandler.END
+
+
+
+timezone_handler = ConversationHandler(
+    entry_points=[CommandHandler("timezone", timezone_command)],
+    states={},
+    fallbacks=[],
+)
@@ -1,9 +1,12 @@
+from typing import Optional
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import FileResponse
-import os
-from utils import is_telegram_ip
+from fastapi.responses import StreamingResponse
+import orjson
+from utils import IPAllowList, WebhookGuard, TELEGRAM_SUBNETS
 from bot.bot import TelegramBot
-import asyncio
+from bot.config import Config
+from bot.db.snapshot import iter_chunks
+from bot.db.export import EXPORT_FORMATS
 import logging
 
 logging.basicConfig(
@@ -12,12 +15,18 @@ logging.basicConfig(
 )
 
 telegram_bot = None
+webhook_guard = WebhookGuard(IPAllowList(TELEGRAM_SUBNETS + Config.WEBHOOK_ALLOWED_CIDRS), Config.WEBHOOK_SECRET)
 
 async def lifespan(app: FastAPI):
     global telegram_bot
     telegram_bot = await TelegramBot.get_instance()
     await telegram_bot.set_webhook()
     yield
+    if telegram_bot.message_scheduler is not None:
+        await telegram_bot.message_scheduler.stop_scheduler()
+    await telegram_bot.ingestor.stop()
+    await telegram_bot.outbox.stop()
+    await telegram_bot.shutdown()
     # requests.get(f"{TELEGRAM_API}/deleteWebhook")
 
 
@@ -29,26 +38,59 @@ async def webhook(request: Request):
     x_forwarded_for = request.headers.get("X-Forwarded-For")
     client_ip = x_forwarded_for.split(",")[0].strip() if x_forwarded_for else request.client.host
 
-    if not is_telegram_ip(client_ip):
+    # Checked before reading or parsing the body.
+    if not webhook_guard.allows(client_ip, request.headers.get("X-Telegram-Bot-Api-Secret-Token")):
+        if webhook_guard.secret_token is not None:
+            raise HTTPException(status_code=403, detail="Forbidden: Invalid secret token.")
         raise HTTPException(status_code=403, detail="Forbidden: Only ip addresses in telegram's subnet are allowed to access this route.")
-    update_json = await request.json()
+    try:
+        update_json = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body.")
     logging.info("Webhook triggered")
-    asyncio.create_task(telegram_bot.process_update(update_json))
+    if not telegram_bot.ingestor.submit(update_json):
+        # Telegram retries undelivered updates, so shed load instead of queueing without bound.
+        raise HTTPException(status_code=503, detail="Update queue is full, please retry later.")
     return { "status": "ok" }
 
 
-DATABASE_FILE = "internal_proj.db" 
+@app.get("/metrics")
+async def metrics():
+    """
+    Returns webhook ingestion queue metrics.
+    """
+    return telegram_bot.ingestor.metrics()
+
 
 @app.get("/download_db")
 async def download_db():
     """
-    Returns the current database file as a downloadable attachment.
+    Returns a consistent, gzip-compressed snapshot of the database as a downloadable attachment.
+    """
+    snapshot = await telegram_bot.database.open_snapshot()
+    return StreamingResponse(
+        iter_chunks(snapshot),
+        media_type="application/gzip",
+        headers={"Content-Disposition": 'attachment; filename="internal_proj.db.gz"'},
+    )
+
+
+@app.get("/export/{table}")
+async def export(table: str, format: str = "csv", since: Optional[str] = None):
+    """
+    Streams users, reflections or per-day completions as CSV or NDJSON.
+
+    Pass the last cursor value received (RowId for users, id for reflections,
+    a YYYY-MM-DD date for completions) as `since` to fetch only newer rows.
+    Completions re-send the whole `since` date, so rows logged on it after the
+    last export are included; rows already received for it come again.
     """
-    if not os.path.exists(DATABASE_FILE):
-        raise HTTPException(status_code=404, detail="Database file not found.")
-    
-    return FileResponse(
-        path=DATABASE_FILE,
-        filename="internal_proj.db",
-        media_type="application/octet-stream"
-    )
\ No newline at end of file
+    try:
+        chunks = telegram_bot.database.export(table, format, since)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{format}"'},
+    )
@@ -0,0 +1,71 @@
+import itertools
+import random
+import sqlite3
+from datetime import timedelta
+import pytest
+from bot.db.db import Database
+from bot.db.db_utils import DAY_EPOCH, PackedStreak, StreakScore, score_day, score_streak, streak_append, streak_to_points
+from bot.db.migrations import migrate
+
+SEED = 20250301
+
+
+def _histories():
+    """Every history up to 10 days, then seeded random ones of varied length and density."""
+    for length in range(11):
+        for bits in itertools.product("01", repeat=length):
+            yield "".join(bits)
+    rng = random.Random(SEED)
+    for _ in range(2000):
+        density = rng.random()
+        yield "".join("1" if rng.random() < density else "0" for _ in range(rng.randint(0, 120)))
+
+
+def test_score_day_matches_streak_to_points_on_every_prefix():
+    for history in _histories():
+        score = StreakScore()
+        assert score.points == streak_to_points("")
+        for day, bit in enumerate(history, start=1):
+            score = score_day(score, bit == "1")
+            assert score.points == streak_to_points(history[:day]), history[:day]
+        assert score == score_streak(history)
+        assert score == score_streak(PackedStreak.from_text(history))
+
+
+@pytest.fixture
+def connection():
+    con = sqlite3.connect(":memory:")
+    con.create_function("streak_append", 2, streak_append)
+    migrate(con)
+    yield con
+    con.close()
+
+
+def test_missed_day_update_matches_score_day(connection):
+    """The rollover's SQL missed-day transitions equal score_day(..., False)."""
+    rng = random.Random(SEED)
+    day = 20000  # Closed day; every user last completed before it.
+    users = {}
+    for telegram in range(500):
+        history = "".join(rng.choice("01") for _ in range(rng.randint(1, 60)))
+        score = score_streak(history)
+        users[str(telegram)] = (history, score)
+        connection.execute(
+            """
+            INSERT INTO Users (Telegram, StreakBits, StreakDays, LastDoneDay, BankedPoints, SegmentLength, PendingMiss)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (str(telegram), PackedStreak.from_text(history).to_blob(), len(history), day - rng.randint(1, 5),
+             score.banked, score.segment_length, int(score.pending_miss))
+        )
+
+    cursor = connection.cursor()
+    updated = Database._close_day(cursor, DAY_EPOCH + timedelta(days=day))
+    assert updated == len(users)
+
+    cursor.execute("SELECT Telegram, StreakBits, BankedPoints, SegmentLength, PendingMiss FROM Users")
+    for telegram, streak_bits, banked, segment_length, pending_miss in cursor.fetchall():
+        history, score = users[telegram]
+        assert StreakScore(banked, segment_length, bool(pending_miss)) == score_day(score, False), history
+        assert str(PackedStreak.from_blob(streak_bits)) == history + "0"
+
@@ -0,0 +1,39 @@
+import os
+
+# Must be set before the config is imported.
+os.environ.setdefault("PROCESS_ROLE", "worker")
+
+import asyncio
+import logging
+import signal
+from bot.bot import TelegramBot
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    level=logging.INFO,
+)
+
+
+async def run_worker():
+    """
+    Runs the background side of the bot: the scheduler (reminders, reflections
+    and the nightly streak rollover) and delivery of the broadcast outbox.
+
+    Web processes only ingest updates and queue broadcasts in the database,
+    where this process picks them up. Runs until SIGINT or SIGTERM.
+    """
+    telegram_bot = await TelegramBot.get_instance()
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+    logging.info("👷 Worker started")
+    await stopping.wait()
+    logging.info("👷 Worker stopping")
+    await telegram_bot.message_scheduler.stop_scheduler()
+    await telegram_bot.outbox.stop()
+    await telegram_bot.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_worker())